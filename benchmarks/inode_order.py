@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Benchmark recursive chmod in inode order against listing order.
+
+Creates a tree of files with random names (so that, on filesystems with
+hashed directories such as ext4, listing order is unrelated to inode
+order), then times ``set_mode_recursive()`` both ways. Each run starts with
+a cold cache when run as root on Linux, by dropping the page, dentry and
+inode caches; otherwise runs are against a warm cache and mostly show
+overhead. Use --path to put the tree on the disk to be measured.
+
+    python benchmarks/inode_order.py --path /mnt/disk/bench --files 200000
+"""
+import argparse
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+import oschmod
+
+DROP_CACHES = '/proc/sys/vm/drop_caches'
+
+
+def create_tree(path, dirs, files_per_dir):
+    """Create dirs directories of files with random names under path."""
+    for dir_index in range(dirs):
+        dir_path = os.path.join(path, 'dir%d' % dir_index)
+        os.makedirs(dir_path)
+        for _ in range(files_per_dir):
+            name = ''.join(random.choice(string.ascii_lowercase)
+                           for _ in range(16))
+            with open(os.path.join(dir_path, name), 'w'):
+                pass
+
+
+def drop_caches():
+    """Drop page, dentry and inode caches, returning whether it worked."""
+    if not hasattr(os, 'sync'):
+        return False
+    os.sync()
+    try:
+        with open(DROP_CACHES, 'w') as caches:
+            caches.write('3\n')
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def run(path, mode, inode_order):
+    """Time one recursive run."""
+    start = time.time()
+    oschmod.set_mode_recursive(path, mode, inode_order=inode_order)
+    return time.time() - start
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--path', help='directory to create the tree in')
+    parser.add_argument('--dirs', type=int, default=10)
+    parser.add_argument('--files', type=int, default=100000,
+                        help='total number of files')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='oschmod-bench-', dir=args.path)
+    try:
+        create_tree(path, args.dirs, args.files // args.dirs)
+        cold = drop_caches()
+        if not cold:
+            print('cannot drop caches (run as root on Linux for a cold '
+                  'cache); timing with a warm cache', file=sys.stderr)
+
+        results = {False: [], True: []}
+        modes = [0o600, 0o640]
+        for _ in range(args.repeat):
+            for inode_order in (False, True):
+                drop_caches()
+                # alternate modes so every run changes every object
+                modes.reverse()
+                results[inode_order].append(run(path, modes[0], inode_order))
+
+        for inode_order, label in ((False, 'listing order'),
+                                   (True, 'inode order')):
+            times = results[inode_order]
+            print('%-14s best %.3fs, mean %.3fs (%d files, %s cache)' % (
+                label, min(times), sum(times) / len(times), args.files,
+                'cold' if cold else 'warm'))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
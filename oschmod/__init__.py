@@ -26,142 +26,104 @@ These bitwise permissions from the stat module can be used with this module:
 """
 
 import os
-import platform
 import random
 import re
 import stat
 import string
-
-IS_WINDOWS = platform.system() == 'Windows'
-HAS_PYWIN32 = False
-try:
-    import ntsecuritycon  # noqa: F401
-    import win32security  # noqa: F401
-    from pywintypes import error as pywinerror
-    HAS_PYWIN32 = True
-except ImportError:
-    pass
-
-HAS_PWD = False
-try:
-    import pwd            # noqa: F401
-    import grp            # noqa: F401
-    HAS_PWD = True
-except ImportError:
-    pass
-
-if IS_WINDOWS and not HAS_PYWIN32:
-    raise ImportError("win32security and ntsecuritycon required on Windows")
+import threading
+import time
+
+from oschmod.backends import (  # noqa: F401
+    HAS_PWD, NAME_CACHE_SIZE, POSIX_BACKEND, WINDOWS_BACKEND, MemoryBackend,
+    PosixBackend, WindowsBackend, get_backend, set_backend, use_backend)
+from oschmod.backends import _NAME_CACHE
+from oschmod.cache import LookupCache
+from oschmod import concurrency
+from oschmod.concurrency import (  # noqa: F401
+    AUTO_MAX_WORKERS, AUTO_WINDOW, AUTO_WORKERS, BATCH_SIZE, DEFAULT_WORKERS,
+    ConcurrencyController)
+from oschmod.concurrency import _apply
+from oschmod.constants import (  # noqa: F401
+    DIRECTORY, EXECUTE, FILE, GROUP, IS_WINDOWS, OBJECT_TYPES, OPER_TYPES,
+    OTHER, OWNER, OWNER_TYPES, READ, STAT_KEYS, STAT_MODES, SYMBOLIC_SHIFTS,
+    WRITE)
+from oschmod.profile import Profiler  # noqa: F401
+from oschmod.profile import _ProfiledBackend
+from oschmod.throttle import (  # noqa: F401
+    IOPRIO_CLASS_BE, IOPRIO_CLASS_IDLE, IOPRIO_CLASS_SHIFT,
+    IOPRIO_SET_SYSCALLS, IOPRIO_WHO_PROCESS, Throttle, lower_io_priority)
+from oschmod.throttle import _ThrottledBackend
+from oschmod.windows import (  # noqa: F401
+    HAS_PYWIN32, SID_CACHE_SIZE, clear_sid_cache, convert_stat_to_win,
+    convert_win_to_stat, get_sid_cache_stats, print_win_ace_type,
+    print_win_inheritance, print_win_permissions, win_get_group_sid,
+    win_get_object_sids, win_get_other_sid, win_get_owner_sid,
+    win_get_permissions, win_get_user_type, win_get_well_known_sid,
+    win_lookup_account_sid, win_set_permissions)
+from oschmod.windows import (  # noqa: F401
+    _SID_CACHE, _print_win_obj_info, _win_build_security_descriptor,
+    _win_get_descriptor_sids, _win_get_named_security, _win_get_permissions,
+    _win_set_permissions)
 
 if HAS_PYWIN32:
-    W_FLDIR = ntsecuritycon.FILE_LIST_DIRECTORY    # =                        1
-    W_FADFL = ntsecuritycon.FILE_ADD_FILE          # =                       10
-    W_FADSD = ntsecuritycon.FILE_ADD_SUBDIRECTORY  # =                      100
-    W_FRDEA = ntsecuritycon.FILE_READ_EA           # =                     1000
-    W_FWREA = ntsecuritycon.FILE_WRITE_EA          # =                    10000
-    W_FTRAV = ntsecuritycon.FILE_TRAVERSE          # =                   100000
-    W_FDLCH = ntsecuritycon.FILE_DELETE_CHILD      # =                  1000000
-    W_FRDAT = ntsecuritycon.FILE_READ_ATTRIBUTES   # =                 10000000
-    W_FWRAT = ntsecuritycon.FILE_WRITE_ATTRIBUTES  # =                100000000
-    W_DELET = ntsecuritycon.DELETE                 # =        10000000000000000
-    W_RDCON = ntsecuritycon.READ_CONTROL           # =       100000000000000000
-    W_WRDAC = ntsecuritycon.WRITE_DAC              # =      1000000000000000000
-    W_WROWN = ntsecuritycon.WRITE_OWNER            # =     10000000000000000000
-    W_SYNCH = ntsecuritycon.SYNCHRONIZE            # =    100000000000000000000
-    W_FGNEX = ntsecuritycon.FILE_GENERIC_EXECUTE   # =    100100000000010100000
-    W_FGNRD = ntsecuritycon.FILE_GENERIC_READ      # =    100100000000010001001
-    W_FGNWR = ntsecuritycon.FILE_GENERIC_WRITE     # =    100100000000100010110
-    W_GENAL = ntsecuritycon.GENERIC_ALL         # 10000000000000000000000000000
-    W_GENEX = ntsecuritycon.GENERIC_EXECUTE    # 100000000000000000000000000000
-    W_GENWR = ntsecuritycon.GENERIC_WRITE     # 1000000000000000000000000000000
-    W_GENRD = ntsecuritycon.GENERIC_READ    # -10000000000000000000000000000000
-
-    W_DIRRD = W_FLDIR | W_FRDEA | W_FRDAT | W_RDCON | W_SYNCH
-    W_DIRWR = W_FADFL | W_FADSD | W_FWREA | W_FDLCH | W_FWRAT | W_DELET | \
-        W_RDCON | W_WRDAC | W_WROWN | W_SYNCH
-    W_DIREX = W_FTRAV | W_RDCON | W_SYNCH
-
-    W_FILRD = W_FGNRD
-    W_FILWR = W_FDLCH | W_DELET | W_WRDAC | W_WROWN | W_FGNWR
-    W_FILEX = W_FGNEX
-
-    WIN_RWX_PERMS = [
-        [W_FILRD, W_FILWR, W_FILEX],
-        [W_DIRRD, W_DIRWR, W_DIREX]
-    ]
-
-    WIN_FILE_PERMISSIONS = (
-        "DELETE", "READ_CONTROL", "WRITE_DAC", "WRITE_OWNER",
-        "SYNCHRONIZE", "FILE_GENERIC_READ", "FILE_GENERIC_WRITE",
-        "FILE_GENERIC_EXECUTE", "FILE_DELETE_CHILD")
-
-    WIN_DIR_PERMISSIONS = (
-        "DELETE", "READ_CONTROL", "WRITE_DAC", "WRITE_OWNER",
-        "SYNCHRONIZE", "FILE_ADD_SUBDIRECTORY", "FILE_ADD_FILE",
-        "FILE_DELETE_CHILD", "FILE_LIST_DIRECTORY", "FILE_TRAVERSE",
-        "FILE_READ_ATTRIBUTES", "FILE_WRITE_ATTRIBUTES", "FILE_READ_EA",
-        "FILE_WRITE_EA")
-
-    WIN_DIR_INHERIT_PERMISSIONS = (
-        "DELETE", "READ_CONTROL", "WRITE_DAC", "WRITE_OWNER",
-        "SYNCHRONIZE", "GENERIC_READ", "GENERIC_WRITE", "GENERIC_EXECUTE",
-        "GENERIC_ALL")
-
-    WIN_ACE_TYPES = (
-        "ACCESS_ALLOWED_ACE_TYPE", "ACCESS_DENIED_ACE_TYPE",
-        "SYSTEM_AUDIT_ACE_TYPE", "SYSTEM_ALARM_ACE_TYPE")
-
-    WIN_INHERITANCE_TYPES = (
-        "OBJECT_INHERIT_ACE", "CONTAINER_INHERIT_ACE",
-        "NO_PROPAGATE_INHERIT_ACE", "INHERIT_ONLY_ACE",
-        "INHERITED_ACE", "SUCCESSFUL_ACCESS_ACE_FLAG",
-        "FAILED_ACCESS_ACE_FLAG")
-
-    SECURITY_NT_AUTHORITY = ('SYSTEM', 'NT AUTHORITY', 5)
-
-FILE = 0
-DIRECTORY = 1
-
-OBJECT_TYPES = [FILE, DIRECTORY]
-
-OWNER = 0
-GROUP = 1
-OTHER = 2
-
-OWNER_TYPES = [OWNER, GROUP, OTHER]
-
-READ = 0
-WRITE = 1
-EXECUTE = 2
-
-OPER_TYPES = [READ, WRITE, EXECUTE]
-
-STAT_MODES = [
-    [stat.S_IRUSR, stat.S_IWUSR, stat.S_IXUSR],
-    [stat.S_IRGRP, stat.S_IWGRP, stat.S_IXGRP],
-    [stat.S_IROTH, stat.S_IWOTH, stat.S_IXOTH]
-]
-
-STAT_KEYS = (
-    "S_IRUSR",
-    "S_IWUSR",
-    "S_IXUSR",
-    "S_IRGRP",
-    "S_IWGRP",
-    "S_IXGRP",
-    "S_IROTH",
-    "S_IWOTH",
-    "S_IXOTH"
-)
+    from oschmod.windows import (  # noqa: F401
+        SECURITY_NT_AUTHORITY, WIN_ACE_TYPES, WIN_DIR_INHERIT_PERMISSIONS,
+        WIN_DIR_PERMISSIONS, WIN_FILE_PERMISSIONS, WIN_INHERITANCE_TYPES,
+        WIN_RWX_PERMS, W_DELET, W_DIREX, W_DIRRD, W_DIRWR, W_FADFL, W_FADSD,
+        W_FDLCH, W_FGNEX, W_FGNRD, W_FGNWR, W_FILEX, W_FILRD, W_FILWR,
+        W_FLDIR, W_FRDAT, W_FRDEA, W_FTRAV, W_FWRAT, W_FWREA, W_GENAL,
+        W_GENEX, W_GENRD, W_GENWR, W_RDCON, W_SYNCH, W_WRDAC, W_WROWN)
+
+MODE_CACHE_SIZE = 4096
 
 __version__ = "0.3.12"
 
+_MODE_CACHE = LookupCache(MODE_CACHE_SIZE)
+
+
+class Stats:
+    """Counters filled in by recursive operations.
+
+    ``events`` holds (elapsed seconds, message) tuples describing decisions
+    made during a run. ``deduplicated`` counts objects skipped because
+    another hard link to the same file was already done."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    COUNTERS = ('visited', 'changed', 'unchanged', 'missing', 'errors',
+                'deduplicated')
+
+    def __init__(self):
+        self.visited = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.missing = 0
+        self.errors = 0
+        self.deduplicated = 0
+        self.events = []
+        self._start = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """Add to counters, safely across threads."""
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def log(self, message):
+        """Record an event."""
+        with self._lock:
+            self.events.append((time.time() - self._start, message))
+
+    def as_dict(self):
+        """Get counters as a dict."""
+        with self._lock:
+            return dict((name, getattr(self, name)) for name in self.COUNTERS)
+
 
 def get_mode(path):
     """Get bitwise mode (stat) of object (dir or file)."""
-    if IS_WINDOWS:
-        return win_get_permissions(path)
-    return os.stat(path).st_mode & (stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+    return get_backend().get_mode(path)
 
 
 def set_mode(path, mode):
@@ -173,70 +135,393 @@ def set_mode(path, mode):
     2. Octal mode - a string expressing an octal number (eg, "777")
     3. Symbolic representation - a string with modifier symbols (eg, "+x")
     """
+    _set_mode(path, mode)
+
+
+def _set_mode(path, mode, templates=None, object_type=None, backend=None):
+    """Set mode of object, sharing Windows descriptor templates if given.
+
+    Returns the new mode."""
+    # pylint: disable=protected-access
+    if backend is None:
+        backend = get_backend()
+    current_mode = None
+    if _is_symbolic(mode):
+        if object_type is None:
+            object_type = backend.get_object_type(path)
+        # with special bits, so symbolic modes keep or change them
+        current_mode = backend._get_full_mode(path)
+
+    new_mode = _get_new_mode(mode, current_mode, object_type)
+    backend.set_mode(path, new_mode, templates)
+    return new_mode
+
+
+def _is_symbolic(mode):
+    """Get whether mode is a symbolic representation (eg, "u+x")."""
+    return isinstance(mode, str) and (
+        '+' in mode or '-' in mode or '=' in mode)
+
+
+def _get_new_mode(mode, current_mode, object_type=FILE):
+    """Get bitwise mode from decimal, octal or symbolic mode.
+
+    current_mode is only used for symbolic modes."""
     new_mode = 0
     if isinstance(mode, int):
         new_mode = mode
     elif isinstance(mode, str):
-        if '+' in mode or '-' in mode or '=' in mode:
-            new_mode = get_effective_mode(get_mode(path), mode)
+        if _is_symbolic(mode):
+            # few distinct (mode, current mode) pairs occur, so parsing the
+            # symbolic mode once for each is enough
+            new_mode = _MODE_CACHE.get(
+                (mode, current_mode, object_type),
+                lambda: get_effective_mode(current_mode, mode, object_type))
         else:
             new_mode = int(mode, 8)
 
-    if IS_WINDOWS:
-        return win_set_permissions(path, new_mode)
-    return os.chmod(path, new_mode)
+    return new_mode
 
 
-def set_mode_recursive(path, mode, dir_mode=None):
+def set_mode_recursive(path, mode, dir_mode=None, *, throttle=None,
+                       workers=DEFAULT_WORKERS, stats=None, profiler=None,
+                       acl=None, dedupe_hardlinks=False, inode_order=False):
     r"""
     Set all file and directory permissions at or under path to modes.
 
+    Arguments after dir_mode can only be given by keyword.
+
     Args:
     path: (:obj:`str`)
         Object which will have its mode set. If path is a file, only its mode
         is set - no recursion occurs. If path is a directory, its mode and the
         mode of all files and subdirectories below it are set.
 
-    mode: (`int`)
-        Mode to be applied to object(s).
+    mode: (`int` or `str`)
+        Mode to be applied to object(s). Symbolic modes are applied to each
+        object's current mode so, for example, "a+X" gives execute
+        permission to directories and already executable files in one pass.
 
-    dir_mode: (`int`)
+    dir_mode: (`int` or `str`)
         If provided, this mode is given to all directories only.
 
+    throttle: (:obj:`Throttle`)
+        If provided, limits the rate of metadata operations and allows the
+        run to be paused.
+
+    workers: (`int`, `str` or :obj:`ConcurrencyController`)
+        Number of objects to work on concurrently. With "auto" (or a
+        controller), the number is adjusted as the run goes to get the most
+        throughput from the filesystem without latency collapsing.
+
+    stats: (:obj:`Stats`)
+        If provided, counters and concurrency decisions are added to this
+        object.
+
+    profiler: (:obj:`Profiler`)
+        If provided, time spent listing, stat-ing and changing modes is
+        recorded per directory, to find slow subtrees.
+
+    acl: (:obj:`str`)
+        If provided (Linux only), POSIX ACL in setfacl syntax (eg,
+        "g:devs:rwX,d:g:devs:rwX") given to each object after its mode is
+        set, as in ``oschmod.acl.set_acl()``. Default entries are only
+        given to directories.
+
+    dedupe_hardlinks: (`bool`)
+        If true, files with several hard links below path are only set
+        once, which saves operations in trees with many links (eg, package
+        stores) at the cost of a stat for each file. Skipped links are
+        counted in ``stats.deduplicated``.
+
+    inode_order: (`bool`)
+        If true, files are set in batches sorted by inode number rather
+        than in directory listing order, which can cut seeks on spinning
+        disks and large ext4 or XFS volumes when metadata is not cached.
+
+    Returns:
+        :obj:`Stats` with counts of visited and deduplicated objects. Modes
+        are set without first reading them (except to apply symbolic
+        modes), so changed and unchanged objects are not counted.
+
     """
-    if get_object_type(path) == FILE:
-        return set_mode(path, mode)
+    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-locals
+    backend = get_backend()
+    if stats is None:
+        stats = Stats()
+    if profiler is not None:
+        # wrapped inside the throttle so waits are not counted as latency
+        profiler.root = os.path.normpath(path)
+        backend = _ProfiledBackend(backend, profiler)
+    if throttle is not None:
+        backend = _ThrottledBackend(backend, throttle)
+
+    set_acl = None
+    if acl:
+        # pylint: disable=import-outside-toplevel
+        from oschmod.acl import set_acl
+
+    def apply(item_path, item_mode, templates, object_type):
+        """Set mode (and ACL) of an object."""
+        new_mode = _set_mode(
+            item_path, item_mode, templates, object_type, backend)
+        if set_acl is not None:
+            set_acl(item_path, acl, new_mode, object_type, backend)
+        stats.add(visited=1)
+
+    if backend.get_object_type(path) == FILE:
+        apply(path, mode, None, FILE)
+        return stats
 
     if not dir_mode:
         dir_mode = mode
 
-    for root, dirs, files in os.walk(path, topdown=False):
-        for one_file in files:
-            set_mode(os.path.join(root, one_file), mode)
+    # most objects share owner, group and mode so, on Windows, security
+    # descriptors are built once and reused for the rest of the run
+    templates = {}
+
+    # (device, inode) of files with several links, packed into one int
+    linked = set()
+    linked_lock = threading.Lock()
+
+    def is_linked_again(entry):
+        """Get whether entry is a hard link to a file already done."""
+        # through the backend, so the stat is throttled and profiled
+        entry_stat = backend.stat(entry.path)
+        if entry_stat.st_nlink < 2:
+            return False
+        key = (entry_stat.st_dev << 64) | entry_stat.st_ino
+        with linked_lock:
+            if key in linked:
+                return True
+            linked.add(key)
+        return False
+
+    def apply_mode(item):
+        """Set mode of a file or directory found below path."""
+        object_type, item_path, entry = item
+        if dedupe_hardlinks and object_type == FILE and \
+                is_linked_again(entry):
+            stats.add(visited=1, deduplicated=1)
+            return
+        apply(item_path, mode if object_type == FILE else dir_mode,
+              templates, object_type)
+
+    items = _iter_tree(path, backend)
+    if inode_order:
+        items = _inode_ordered(items)
+    _apply(items, apply_mode, workers, stats)
+    apply(path, dir_mode, templates, DIRECTORY)
+    return stats
+
+
+def copy_modes_recursive(src, dst, *, workers=DEFAULT_WORKERS, stats=None,
+                         throttle=None):
+    r"""
+    Copy modes of objects at or under src to matching objects under dst.
+
+    The trees are walked in lockstep, one directory at a time, merging the
+    sorted entries of each side. Objects are matched by relative path and a
+    mode, including setuid, setgid and sticky bits, is only set where it
+    differs. Source objects with no matching
+    destination (or a mismatched type) are counted as missing and skipped,
+    as are symlinks. Arguments after dst can only be given by keyword.
+
+    Args:
+    src: (:obj:`str`)
+        Reference file or directory.
+
+    dst: (:obj:`str`)
+        File or directory whose mode and, for directories, whose descendants'
+        modes are set.
 
-        for one_dir in dirs:
-            set_mode(os.path.join(root, one_dir), dir_mode)
+    workers: (`int`, `str` or :obj:`ConcurrencyController`)
+        Number of objects to work on concurrently, or "auto" to adjust it to
+        the filesystem as in ``set_mode_recursive()``.
 
-    return set_mode(path, dir_mode)
+    stats: (:obj:`Stats`)
+        If provided, counters are added to this object.
 
+    throttle: (:obj:`Throttle`)
+        If provided, limits the rate of metadata operations and allows the
+        run to be paused.
 
-def _get_effective_mode_multiple(current_mode, modes):
+    Returns:
+        :obj:`Stats` with counts of visited, changed, unchanged and missing
+        objects.
+
+    """
+    # pylint: disable=protected-access
+    backend = get_backend()
+    if throttle is not None:
+        backend = _ThrottledBackend(backend, throttle)
+    if stats is None:
+        stats = Stats()
+
+    templates = {}
+
+    def copy_mode(item):
+        """Copy mode of source entry to destination entry."""
+        _, src_entry, dst_entry = item
+        mode = backend._get_full_entry_mode(src_entry)
+        stats.add(visited=1)
+        if backend._get_full_entry_mode(dst_entry) == mode:
+            stats.add(unchanged=1)
+            return
+        backend.set_mode(dst_entry.path, mode, templates)
+        stats.add(changed=1)
+
+    if backend.get_object_type(src) == DIRECTORY and \
+            backend.get_object_type(dst) == DIRECTORY:
+        _apply(_walk_pairs(src, dst, backend, stats), copy_mode, workers,
+               stats)
+
+    mode = backend._get_full_mode(src)
+    stats.add(visited=1)
+    if backend._get_full_mode(dst) == mode:
+        stats.add(unchanged=1)
+    else:
+        backend.set_mode(dst, mode, templates)
+        stats.add(changed=1)
+
+    return stats
+
+
+def _inode_ordered(items, size=None):
+    """Yield (object type, path, entry) items with files in inode order.
+
+    Runs of up to size files are sorted by inode number, which DirEntry
+    objects know without a system call, so that stat and chmod calls move
+    through the inode table rather than jumping around it in listing
+    order. Directories are yielded in place, after the files before them,
+    so they are still set after everything below them."""
+    size = size or concurrency.BATCH_SIZE
+    files = []
+    for item in items:
+        if item[0] == FILE:
+            files.append(item)
+            if len(files) < size:
+                continue
+        files.sort(key=lambda file_item: file_item[2].inode())
+        yield from files
+        files = []
+        if item[0] != FILE:
+            yield item
+
+    files.sort(key=lambda file_item: file_item[2].inode())
+    yield from files
+
+
+def _walk_pairs(src, dst, backend, stats):
+    """Yield (object type, src entry, dst entry) for matching objects.
+
+    Objects below src and dst are yielded bottom-up. Only the directories
+    waiting to be expanded or finished are kept, not lists of paths."""
+    pending = [(src, dst, None, None, False)]
+    while pending:
+        src_dir, dst_dir, src_entry, dst_entry, expanded = pending.pop()
+        if expanded:
+            if src_entry is not None:
+                yield DIRECTORY, src_entry, dst_entry
+            continue
+
+        pending.append((src_dir, dst_dir, src_entry, dst_entry, True))
+        for src_child, dst_child in _merge_entries(
+                src_dir, dst_dir, backend, stats):
+            if src_child.is_symlink() or dst_child.is_symlink():
+                continue
+            if src_child.is_dir() != dst_child.is_dir():
+                stats.add(missing=1)
+            elif src_child.is_dir():
+                pending.append((src_child.path, dst_child.path, src_child,
+                                dst_child, False))
+            else:
+                yield FILE, src_child, dst_child
+
+
+def _merge_entries(src_dir, dst_dir, backend, stats):
+    """Yield pairs of entries with the same name in two directories."""
+    try:
+        src_entries = sorted(backend.scandir(src_dir), key=_entry_name)
+        dst_entries = sorted(backend.scandir(dst_dir), key=_entry_name)
+    except OSError:
+        stats.add(errors=1)
+        return
+
+    dst_index = 0
+    for src_entry in src_entries:
+        while dst_index < len(dst_entries) and \
+                dst_entries[dst_index].name < src_entry.name:
+            dst_index += 1
+        if dst_index < len(dst_entries) and \
+                dst_entries[dst_index].name == src_entry.name:
+            yield src_entry, dst_entries[dst_index]
+            dst_index += 1
+        else:
+            stats.add(missing=1)
+
+
+def _entry_name(entry):
+    """Get name of a scandir entry, for sorting."""
+    return entry.name
+
+
+def _iter_tree(path, backend):
+    """Yield (object type, path, entry) for objects below path, bottom-up.
+
+    Files are yielded straight from the directory iterator, so memory use
+    does not grow with the width of directories. Only directories waiting
+    to be expanded, or to be yielded once everything below them has been,
+    are kept. Symlinks to directories are yielded but not followed."""
+    pending = [(path, None, False)]
+    while pending:
+        dir_path, dir_entry, expanded = pending.pop()
+        if expanded:
+            if dir_entry is not None:
+                yield DIRECTORY, dir_path, dir_entry
+            continue
+
+        pending.append((dir_path, dir_entry, True))
+        try:
+            for entry in backend.scandir(dir_path):
+                if not entry.is_dir():
+                    yield FILE, entry.path, entry
+                elif entry.is_symlink():
+                    yield DIRECTORY, entry.path, entry
+                else:
+                    pending.append((entry.path, entry, False))
+        except OSError:
+            # like os.walk, skip directories that cannot be listed
+            continue
+
+
+def _get_effective_mode_multiple(current_mode, modes, object_type=FILE):
     """Get octal mode, given current mode and symbolic mode modifiers."""
     new_mode = current_mode
     for mode in modes.split(","):
-        new_mode = get_effective_mode(new_mode, mode)
+        new_mode = get_effective_mode(new_mode, mode, object_type)
     return new_mode
 
 
-def get_effective_mode(current_mode, symbolic):
-    """Get octal mode, given current mode and symbolic mode modifier."""
+def get_effective_mode(current_mode, symbolic, object_type=FILE):
+    """Get octal mode, given current mode and symbolic mode modifier.
+
+    Besides "rwx", permissions can be "X" (execute only if the object is a
+    directory or already has execute permission for someone), "s" (setuid
+    for "u", setgid for "g"), "t" (sticky, for "o"), or a single "u", "g"
+    or "o" to copy that class's current permissions. Setuid, setgid and
+    sticky bits in current_mode are kept unless modified. As with GNU
+    chmod, "=" keeps a directory's setuid and setgid bits."""
     if not isinstance(symbolic, str):
         raise AttributeError('symbolic must be a string')
 
     if "," in symbolic:
-        return _get_effective_mode_multiple(current_mode, symbolic)
+        return _get_effective_mode_multiple(
+            current_mode, symbolic, object_type)
 
-    result = re.search(r'^\s*([ugoa]*)([-+=])([rwx]*)\s*$', symbolic)
+    result = re.search(
+        r'^\s*([ugoa]*)([-+=])([rwxXst]*|[ugo])\s*$', symbolic)
     if result is None:
         raise AttributeError('bad format of symbolic representation modifier')
 
@@ -248,15 +533,30 @@ def get_effective_mode(current_mode, symbolic):
         whom = "ugo"
 
     # bitwise magic
-    bit_perm = _get_basic_symbol_to_mode(perm)
+    if perm in SYMBOLIC_SHIFTS:
+        bit_perm = (current_mode >> SYMBOLIC_SHIFTS[perm]) & 7
+    else:
+        bit_perm = _get_basic_symbol_to_mode(perm)
+        if "X" in perm and (object_type == DIRECTORY or current_mode & (
+                stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)):
+            bit_perm = bit_perm | 1
+
     mask_mode = ("u" in whom and bit_perm << 6) | \
         ("g" in whom and bit_perm << 3) | \
-        ("o" in whom and bit_perm << 0)
+        ("o" in whom and bit_perm << 0) | \
+        ("s" in perm and "u" in whom and stat.S_ISUID) | \
+        ("s" in perm and "g" in whom and stat.S_ISGID) | \
+        ("t" in perm and "o" in whom and stat.S_ISVTX)
 
     if operation == "=":
         original = ("u" not in whom and current_mode & 448) | \
             ("g" not in whom and current_mode & 56) | \
-            ("o" not in whom and current_mode & 7)
+            ("o" not in whom and current_mode & 7) | \
+            (("u" not in whom or object_type == DIRECTORY) and
+             current_mode & stat.S_ISUID) | \
+            (("g" not in whom or object_type == DIRECTORY) and
+             current_mode & stat.S_ISGID) | \
+            ("o" not in whom and current_mode & stat.S_ISVTX)
         return mask_mode | original
 
     if operation == "+":
@@ -267,101 +567,26 @@ def get_effective_mode(current_mode, symbolic):
 
 def get_object_type(path):
     """Get whether object is file or directory."""
-    object_type = DIRECTORY
-    if os.path.isfile(path):
-        object_type = FILE
-
-    return object_type
+    return get_backend().get_object_type(path)
 
 
 def get_owner(path):
     """Get the object owner."""
-    if IS_WINDOWS:
-        return win32security.LookupAccountSid(None, win_get_owner_sid(path))
-    return pwd.getpwuid(os.stat(path).st_uid).pw_name
+    return get_backend().get_owner(path)
 
 
 def get_group(path):
     """Get the object group."""
-    if IS_WINDOWS:
-        return win32security.LookupAccountSid(None, win_get_group_sid(path))
-    return grp.getgrgid(os.stat(path).st_gid).gr_name
+    return get_backend().get_group(path)
 
 
-def win_get_owner_sid(path):
-    """Get the file owner."""
-    sec_descriptor = win32security.GetNamedSecurityInfo(
-        path, win32security.SE_FILE_OBJECT,
-        win32security.OWNER_SECURITY_INFORMATION)
-    return sec_descriptor.GetSecurityDescriptorOwner()
-
-
-def win_get_group_sid(path):
-    """Get the file group."""
-    sec_descriptor = win32security.GetNamedSecurityInfo(
-        path, win32security.SE_FILE_OBJECT,
-        win32security.GROUP_SECURITY_INFORMATION)
-    return sec_descriptor.GetSecurityDescriptorGroup()
-
-
-def win_get_other_sid():
-    """Get the other SID.
-
-    For now this is the Users builtin account. In the future, probably should
-    allow account to be passed in and find any non-owner, non-group account
-    currently associated with the file. As a default, it could use Users."""
-    return win32security.ConvertStringSidToSid("S-1-5-32-545")
-
-
-def convert_win_to_stat(win_perm, user_type, object_type):
-    """Given Win perm and user type, give stat mode."""
-    mode = 0
-
-    for oper in OPER_TYPES:
-        if win_perm & WIN_RWX_PERMS[object_type][oper] == \
-                WIN_RWX_PERMS[object_type][oper]:
-            mode = mode | STAT_MODES[user_type][oper]
-
-    return mode
-
-
-def convert_stat_to_win(mode, user_type, object_type):
-    """Given stat mode, return Win bitwise permissions for user type."""
-    win_perm = 0
-
-    for oper in OPER_TYPES:
-        if mode & STAT_MODES[user_type][oper] == STAT_MODES[user_type][oper]:
-            win_perm = win_perm | WIN_RWX_PERMS[object_type][oper]
-
-    return win_perm
-
-
-def win_get_user_type(sid, sids):
-    """Given object and SIDs, return user type."""
-    if sid == sids[OWNER]:
-        return OWNER
-
-    if sid == sids[GROUP]:
-        return GROUP
-
-    return OTHER
-
-
-def win_get_object_sids(path):
-    """Get the owner, group, other SIDs for an object."""
-    return [
-        win_get_owner_sid(path),
-        win_get_group_sid(path),
-        win_get_other_sid()
-    ]
-
-
-def win_get_permissions(path):
-    """Get the file or dir permissions."""
-    if not os.path.exists(path):
-        raise FileNotFoundError('Path %s could not be found.' % path)
-
-    return _win_get_permissions(path, get_object_type(path))
+def get_cache_stats():
+    """Get hit and miss counters of the mode, name and SID caches."""
+    return {
+        'mode': _MODE_CACHE.stats(),
+        'name': _NAME_CACHE.stats(),
+        'sid': _SID_CACHE.stats()
+    }
 
 
 def _get_basic_symbol_to_mode(symbol):
@@ -371,93 +596,6 @@ def _get_basic_symbol_to_mode(symbol):
         ("x" in symbol and 1 << 0)
 
 
-def _win_get_permissions(path, object_type):
-    """Get the permissions."""
-    sec_des = win32security.GetNamedSecurityInfo(
-        path, win32security.SE_FILE_OBJECT,
-        win32security.DACL_SECURITY_INFORMATION)
-    dacl = sec_des.GetSecurityDescriptorDacl()
-
-    sids = win_get_object_sids(path)
-    mode = 0
-
-    for index in range(0, dacl.GetAceCount()):
-        ace = dacl.GetAce(index)
-        if ace[0][0] == win32security.ACCESS_ALLOWED_ACE_TYPE and \
-                win32security.LookupAccountSid(None, ace[2]) != \
-                SECURITY_NT_AUTHORITY:
-            # Not handling win32security.ACCESS_DENIED_ACE_TYPE
-            mode = mode | convert_win_to_stat(
-                ace[1],
-                win_get_user_type(ace[2], sids),
-                object_type)
-
-    return mode
-
-
-def win_set_permissions(path, mode):
-    """Set the file or dir permissions."""
-    if not os.path.exists(path):
-        raise FileNotFoundError('Path %s could not be found.' % path)
-
-    _win_set_permissions(path, mode, get_object_type(path))
-
-
-def _win_set_permissions(path, mode, object_type):
-    """Set the permissions."""
-    # Overview of Windows inheritance:
-    # Get/SetNamedSecurityInfo  = Always includes inheritance
-    # Get/SetFileSecurity       = Can exclude/disable inheritance
-    # Here we read effective permissions with GetNamedSecurityInfo, i.e.,
-    # including inherited permissions. However, we'll set permissions with
-    # SetFileSecurity and NO_INHERITANCE, to disable inheritance.
-    sec_des = win32security.GetNamedSecurityInfo(
-        path, win32security.SE_FILE_OBJECT,
-        win32security.DACL_SECURITY_INFORMATION)
-    dacl = sec_des.GetSecurityDescriptorDacl()
-
-    system_ace = None
-    for _ in range(0, dacl.GetAceCount()):
-        ace = dacl.GetAce(0)
-        try:
-            if ace[2] and ace[2].IsValid() and win32security.LookupAccountSid(
-                    None, ace[2]) == SECURITY_NT_AUTHORITY:
-                system_ace = ace
-        except pywinerror:
-            print("Found orphaned SID:", ace[2])
-        dacl.DeleteAce(0)
-
-    if system_ace:
-        dacl.AddAccessAllowedAceEx(
-            dacl.GetAclRevision(),
-            win32security.NO_INHERITANCE, system_ace[1], system_ace[2])
-
-    sids = win_get_object_sids(path)
-
-    for user_type, sid in enumerate(sids):
-        win_perm = convert_stat_to_win(mode, user_type, object_type)
-
-        if win_perm > 0:
-            dacl.AddAccessAllowedAceEx(
-                dacl.GetAclRevision(),
-                win32security.NO_INHERITANCE, win_perm, sid)
-
-    sec_des.SetSecurityDescriptorDacl(1, dacl, 0)
-    win32security.SetFileSecurity(
-        path, win32security.DACL_SECURITY_INFORMATION, sec_des)
-
-
-def print_win_inheritance(flags):
-    """Display inheritance flags."""
-    print("  -Flags:", hex(flags))
-    if flags == win32security.NO_INHERITANCE:
-        print("    ", "NO_INHERITANCE")
-    else:
-        for i in WIN_INHERITANCE_TYPES:
-            if flags & getattr(win32security, i) == getattr(win32security, i):
-                print("    ", i)
-
-
 def print_mode_permissions(mode):
     """Print component permissions in a stat mode."""
     print("Mode:", oct(mode), "(Decimal: " + str(mode) + ")")
@@ -466,42 +604,10 @@ def print_mode_permissions(mode):
             print("  stat." + i)
 
 
-def print_win_ace_type(ace_type):
-    """Print ACE type."""
-    print("  -Type:")
-    for i in WIN_ACE_TYPES:
-        if getattr(ntsecuritycon, i) == ace_type:
-            print("    ", i)
-
-
-def print_win_permissions(win_perm, flags, object_type):
-    """Print permissions from ACE information."""
-    print("  -Permissions Mask:", hex(win_perm), "(" + str(win_perm) + ")")
-
-    # files and directories do permissions differently
-    if object_type == FILE:
-        permissions = WIN_FILE_PERMISSIONS
-    else:
-        permissions = WIN_DIR_PERMISSIONS
-        # directories have ACE that is inherited by children within them
-        if flags & ntsecuritycon.OBJECT_INHERIT_ACE == \
-                ntsecuritycon.OBJECT_INHERIT_ACE and flags & \
-                ntsecuritycon.INHERIT_ONLY_ACE == \
-                ntsecuritycon.INHERIT_ONLY_ACE:
-            permissions = WIN_DIR_INHERIT_PERMISSIONS
-
-    calc_mask = 0  # see if we are printing all of the permissions
-    for i in permissions:
-        if getattr(ntsecuritycon, i) & win_perm == getattr(
-                ntsecuritycon, i):
-            calc_mask = calc_mask | getattr(ntsecuritycon, i)
-            print("    ", i)
-    print("  -Mask calculated from printed permissions:", hex(calc_mask))
-
-
 def print_obj_info(path):
     """Prints object security permission info."""
-    if not os.path.exists(path):
+    backend = get_backend()
+    if not backend.exists(path):
         print(path, "does not exist!")
         raise FileNotFoundError('Path %s could not be found.' % path)
 
@@ -518,31 +624,10 @@ def print_obj_info(path):
     print("Owner:", get_owner(path))
     print("Group:", get_group(path))
 
-    if IS_WINDOWS:
+    if isinstance(backend, WindowsBackend):
         _print_win_obj_info(path)
 
 
-def _print_win_obj_info(path):
-    """Print windows object security info."""
-    # get ACEs
-    sec_descriptor = win32security.GetFileSecurity(
-        path, win32security.DACL_SECURITY_INFORMATION)
-    dacl = sec_descriptor.GetSecurityDescriptorDacl()
-    if dacl is None:
-        print("No Discretionary ACL")
-        return
-
-    for ace_no in range(0, dacl.GetAceCount()):
-        ace = dacl.GetAce(ace_no)
-        print("ACE", ace_no)
-
-        print('  -SID:', win32security.LookupAccountSid(None, ace[2]))
-
-        print_win_ace_type(ace[0][0])
-        print_win_inheritance(ace[0][1])
-        print_win_permissions(ace[1], ace[0][1], get_object_type(path))
-
-
 def perm_test(mode=stat.S_IRUSR | stat.S_IWUSR):
     """Creates test file and modifies permissions."""
     path = ''.join(
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""oschmod acl module.
+
+Set Linux POSIX access control lists (ACLs) from setfacl-style specs, such
+as ``u::rwx,g::r-x,g:devs:rwx,o::---,d:g:devs:rwx``. Entries prefixed with
+``d:`` (or ``default:``) form the default ACL given to directories.
+
+ACLs are written directly to the ``system.posix_acl_access`` and
+``system.posix_acl_default`` extended attributes. Each distinct ACL is
+encoded to its binary form once and the same bytes are written to every
+object that gets it, so applying an ACL to a tree costs one call per
+object.
+"""
+
+import grp
+import pwd
+import struct
+
+from oschmod.backends import get_backend
+from oschmod.cache import LookupCache
+from oschmod.constants import DIRECTORY
+
+ACCESS_XATTR = 'system.posix_acl_access'
+DEFAULT_XATTR = 'system.posix_acl_default'
+
+ACL_EA_VERSION = 2
+ACL_UNDEFINED_ID = 0xFFFFFFFF
+
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+
+# tags without and with a qualifier (user or group)
+ACL_TAGS = {
+    'u': (ACL_USER_OBJ, ACL_USER),
+    'user': (ACL_USER_OBJ, ACL_USER),
+    'g': (ACL_GROUP_OBJ, ACL_GROUP),
+    'group': (ACL_GROUP_OBJ, ACL_GROUP),
+    'm': (ACL_MASK, None),
+    'mask': (ACL_MASK, None),
+    'o': (ACL_OTHER, None),
+    'other': (ACL_OTHER, None),
+}
+
+ACL_PERMS = {'r': 4, 'w': 2, 'x': 1, '-': 0}
+
+HEADER = struct.Struct('<I')
+ENTRY = struct.Struct('<HHI')
+
+ACL_CACHE_SIZE = 1024
+
+_ACL_CACHE = LookupCache(ACL_CACHE_SIZE)
+
+
+def parse_acl(spec):
+    """Parse ACL spec into (access entries, default entries).
+
+    Entries are (tag, id, permissions, conditional execute) tuples, where
+    conditional execute is set for "X" (execute only for directories and
+    objects already executable by someone). Users and groups can be given
+    by name or number."""
+    access = []
+    default = []
+    for text in spec.replace('\n', ',').split(','):
+        text = text.strip()
+        if not text:
+            continue
+
+        fields = text.split(':')
+        entries = access
+        if fields[0] in ('d', 'default'):
+            entries = default
+            fields = fields[1:]
+        if len(fields) == 2 and fields[0] in ('m', 'mask', 'o', 'other'):
+            fields.insert(1, '')
+        if len(fields) != 3 or fields[0] not in ACL_TAGS:
+            raise ValueError('bad ACL entry: %s' % text)
+
+        tag_name, qualifier, perms = fields
+        tag, qualified_tag = ACL_TAGS[tag_name]
+        acl_id = ACL_UNDEFINED_ID
+        if qualifier:
+            if qualified_tag is None:
+                raise ValueError('bad ACL entry: %s' % text)
+            tag = qualified_tag
+            acl_id = _get_id(qualifier, tag)
+
+        entries.append((tag, acl_id) + _parse_perms(perms, text))
+
+    return tuple(access), tuple(default)
+
+
+def _parse_perms(perms, text):
+    """Get (permission bits, conditional execute) of perms."""
+    if len(perms) == 1 and perms in '01234567':
+        return int(perms), False
+    if not perms or any(
+            char not in ACL_PERMS and char != 'X' for char in perms):
+        raise ValueError('bad ACL permissions: %s' % text)
+    return sum(ACL_PERMS.get(char, 0) for char in perms), 'X' in perms
+
+
+def _get_id(qualifier, tag):
+    """Get uid or gid of a user or group name (or number)."""
+    if qualifier.isdigit():
+        return int(qualifier)
+    try:
+        if tag == ACL_USER:
+            return pwd.getpwnam(qualifier).pw_uid
+        return grp.getgrnam(qualifier).gr_gid
+    except KeyError as exc:
+        raise ValueError('unknown %s: %s' % (
+            'user' if tag == ACL_USER else 'group', qualifier)) from exc
+
+
+def encode_acl(entries, mode, object_type=DIRECTORY):
+    """Encode ACL entries as the value of an ACL extended attribute.
+
+    Owner, owning group and other entries missing from entries are taken
+    from mode. As with setfacl, if there are named user or group entries
+    but no mask, the mask is the union of the group class permissions."""
+    executable = object_type == DIRECTORY or bool(mode & 0o111)
+    perms = {}
+    for tag, acl_id, bits, conditional in entries:
+        perms[tag, acl_id] = bits | (1 if conditional and executable else 0)
+
+    for tag, shift in ((ACL_USER_OBJ, 6), (ACL_GROUP_OBJ, 3), (ACL_OTHER, 0)):
+        perms.setdefault((tag, ACL_UNDEFINED_ID), (mode >> shift) & 7)
+
+    if any(tag in (ACL_USER, ACL_GROUP) for tag, _ in perms):
+        mask = 0
+        for (tag, _), bits in perms.items():
+            if tag in (ACL_USER, ACL_GROUP_OBJ, ACL_GROUP):
+                mask |= bits
+        perms.setdefault((ACL_MASK, ACL_UNDEFINED_ID), mask)
+
+    # the kernel requires entries ordered by tag, then by id
+    return HEADER.pack(ACL_EA_VERSION) + b''.join(
+        ENTRY.pack(tag, bits, acl_id)
+        for (tag, acl_id), bits in sorted(perms.items()))
+
+
+def _compiled(spec, mode, object_type):
+    """Get (access xattr value or None, default xattr value or None)."""
+    access, default = _ACL_CACHE.get(('spec', spec), lambda: parse_acl(spec))
+    mode &= 0o777
+
+    def compile_acl():
+        """Encode access and default ACLs."""
+        access_value = default_value = None
+        if access:
+            access_value = encode_acl(access, mode, object_type)
+        if default and object_type == DIRECTORY:
+            default_value = encode_acl(default, mode, object_type)
+        return access_value, default_value
+
+    return _ACL_CACHE.get(
+        ('acl', spec, mode, object_type == DIRECTORY), compile_acl)
+
+
+def set_acl(path, spec, mode=None, object_type=None, backend=None):
+    """Set access (and, for directories, default) ACL of object from spec.
+
+    mode is the object's mode, used for owner, owning group and other
+    entries missing from spec; if not given, the current mode is used."""
+    if backend is None:
+        backend = get_backend()
+    if object_type is None:
+        object_type = backend.get_object_type(path)
+    if mode is None:
+        mode = backend.get_mode(path)
+
+    access_value, default_value = _compiled(spec, mode, object_type)
+    if access_value is not None:
+        backend.set_xattr(path, ACCESS_XATTR, access_value)
+    if default_value is not None:
+        backend.set_xattr(path, DEFAULT_XATTR, default_value)
+
+
+def get_acl_cache_stats():
+    """Get hit and miss counters of the ACL cache."""
+    return _ACL_CACHE.stats()
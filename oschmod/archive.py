@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""oschmod archive module.
+
+Rewrite the modes of members of tar archives as ``set_mode_recursive()``
+would set them on an extracted tree, without extracting. Archives are read
+and written as streams, one member at a time, so neither the archive nor
+any member is held in memory and pipes can be used at both ends.
+"""
+
+import stat
+import tarfile
+
+import oschmod
+from oschmod import DIRECTORY, FILE
+
+COMPRESSION_SUFFIXES = (
+    ('.tar.gz', 'gz'), ('.tgz', 'gz'), ('.tar.bz2', 'bz2'), ('.tbz2', 'bz2'),
+    ('.tar.xz', 'xz'), ('.txz', 'xz'))
+
+
+def set_mode_tar(src, dst, mode, dir_mode=None, compression=None):
+    r"""
+    Copy a tar archive, setting modes of its members.
+
+    Args:
+    src: (:obj:`str` or file object)
+        Archive to read, which may be compressed (gzip, bzip2 or xz). A
+        file object need not be seekable, so can be a pipe.
+
+    dst: (:obj:`str` or file object)
+        Archive to write.
+
+    mode: (`int` or `str`)
+        Mode given to files (and other non-directory members), as in
+        ``oschmod.set_mode_recursive()``. Symbolic modes are applied to each
+        member's mode in the archive. Symlinks are left as they are.
+
+    dir_mode: (`int` or `str`)
+        If provided, this mode is given to directories only.
+
+    compression: (:obj:`str`)
+        Compression of the new archive: "gz", "bz2", "xz" or "" for none.
+        If not provided, it is taken from dst's name (eg, ".tar.gz"), or
+        none for file objects.
+
+    Returns:
+        :obj:`Stats` with counts of visited, changed and unchanged members.
+
+    """
+    if not dir_mode:
+        dir_mode = mode
+    if compression is None:
+        compression = _get_compression(dst)
+    stats = oschmod.Stats()
+
+    src_options = {'mode': 'r|*'}
+    src_options['fileobj' if hasattr(src, 'read') else 'name'] = src
+    dst_options = {'mode': 'w|' + compression}
+    dst_options['fileobj' if hasattr(dst, 'write') else 'name'] = dst
+
+    with tarfile.open(**src_options) as src_tar, \
+            tarfile.open(**dst_options) as dst_tar:
+        for info in src_tar:
+            current_mode = stat.S_IMODE(info.mode)
+            if not info.issym():
+                object_type = DIRECTORY if info.isdir() else FILE
+                # pylint: disable=protected-access
+                info.mode = oschmod._get_new_mode(
+                    mode if object_type == FILE else dir_mode, current_mode,
+                    object_type)
+
+            if info.mode != current_mode:
+                stats.add(visited=1, changed=1)
+            else:
+                stats.add(visited=1, unchanged=1)
+
+            # member data is copied in blocks straight from the source stream
+            dst_tar.addfile(
+                info, src_tar.extractfile(info) if info.isreg() else None)
+
+    return stats
+
+
+def _get_compression(dst):
+    """Get compression for archive from its name."""
+    name = dst if isinstance(dst, str) else ''
+    for suffix, compression in COMPRESSION_SUFFIXES:
+        if name.endswith(suffix):
+            return compression
+    return ''
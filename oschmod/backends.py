@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""oschmod backends module.
+
+Backends carry out operations on objects for oschmod's public functions:
+through os calls, through Windows DACLs, or on a virtual tree in memory.
+"""
+
+import collections
+import contextlib
+import errno
+import os
+import stat
+import sys
+import threading
+import time
+
+from oschmod.cache import LookupCache
+from oschmod.constants import DIRECTORY, FILE, IS_WINDOWS
+from oschmod.windows import (
+    win_get_group_sid, win_get_owner_sid, win_get_permissions,
+    win_lookup_account_sid, win_set_permissions)
+
+HAS_PWD = False
+try:
+    import pwd            # noqa: F401
+    import grp            # noqa: F401
+    HAS_PWD = True
+except ImportError:
+    pass
+
+NAME_CACHE_SIZE = 1024
+
+_NAME_CACHE = LookupCache(NAME_CACHE_SIZE)
+
+
+class PosixBackend:
+    """Backend for filesystems reached through os calls (Linux, macOS).
+
+    Public functions dispatch through a backend (see ``get_backend``) so the
+    traversal and mode computation can run against other storage, such as
+    ``MemoryBackend``. Backends provide DirEntry-like objects from
+    ``scandir`` and os.stat_result-like objects from ``stat``."""
+
+    name = 'posix'
+
+    def exists(self, path):
+        """Get whether object exists."""
+        return os.path.exists(path)
+
+    def get_object_type(self, path):
+        """Get whether object is file or directory."""
+        object_type = DIRECTORY
+        if os.path.isfile(path):
+            object_type = FILE
+
+        return object_type
+
+    def stat(self, path, follow_symlinks=True):
+        """Get stat result of object."""
+        return os.stat(path, follow_symlinks=follow_symlinks)
+
+    def scandir(self, path):
+        """Iterate over DirEntry-like objects in a directory."""
+        with os.scandir(path) as entries:
+            yield from entries
+
+    def get_mode(self, path):
+        """Get bitwise mode (stat) of object."""
+        return self._get_full_mode(path) & (
+            stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+
+    def get_entry_mode(self, entry):
+        """Get bitwise mode (stat) of object from a scandir entry."""
+        return self._get_full_entry_mode(entry) & (
+            stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+
+    def _get_full_mode(self, path):
+        """Get mode of object, including setuid, setgid and sticky bits."""
+        return stat.S_IMODE(os.stat(path).st_mode)
+
+    def _get_full_entry_mode(self, entry):
+        """Get mode of object from a scandir entry, with special bits."""
+        return stat.S_IMODE(entry.stat(follow_symlinks=False).st_mode)
+
+    def set_mode(self, path, mode, templates=None):
+        """Set bitwise mode (stat) of object.
+
+        templates is a dict scoped to one recursive run that backends can
+        use to reuse work between objects."""
+        # pylint: disable=unused-argument
+        os.chmod(path, mode)
+
+    def get_xattr(self, path, name):
+        """Get extended attribute of object."""
+        if not hasattr(os, 'getxattr'):
+            raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), path)
+        return os.getxattr(path, name)
+
+    def set_xattr(self, path, name, value):
+        """Set extended attribute of object."""
+        if not hasattr(os, 'setxattr'):
+            raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), path)
+        os.setxattr(path, name, value)
+
+    def get_owner(self, path):
+        """Get the object owner."""
+        uid = os.stat(path).st_uid
+        return _NAME_CACHE.get(
+            ('user', uid), lambda: pwd.getpwuid(uid).pw_name)
+
+    def get_group(self, path):
+        """Get the object group."""
+        gid = os.stat(path).st_gid
+        return _NAME_CACHE.get(
+            ('group', gid), lambda: grp.getgrgid(gid).gr_name)
+
+
+class WindowsBackend(PosixBackend):
+    """Backend translating modes to and from Windows DACLs."""
+
+    name = 'windows'
+
+    def _get_full_mode(self, path):
+        """Get mode of object (Windows has no special bits)."""
+        return win_get_permissions(path)
+
+    def _get_full_entry_mode(self, entry):
+        """Get mode of object from a scandir entry."""
+        return win_get_permissions(entry.path)
+
+    def set_mode(self, path, mode, templates=None):
+        """Set bitwise mode (stat) of object."""
+        win_set_permissions(path, mode, templates)
+
+    def get_xattr(self, path, name):
+        """Get extended attribute of object (not supported)."""
+        raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), path)
+
+    def set_xattr(self, path, name, value):
+        """Set extended attribute of object (not supported)."""
+        raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), path)
+
+    def get_owner(self, path):
+        """Get the object owner."""
+        return win_lookup_account_sid(win_get_owner_sid(path))
+
+    def get_group(self, path):
+        """Get the object group."""
+        return win_lookup_account_sid(win_get_group_sid(path))
+
+
+class _MemoryNode:
+    """Object in a MemoryBackend tree. Files have no children."""
+
+    # pylint: disable=too-few-public-methods
+
+    __slots__ = ('mode', 'ino', 'uid', 'gid', 'children')
+
+    def __init__(self, mode, ino, uid, gid, children=None):
+        self.mode = mode
+        self.ino = ino
+        self.uid = uid
+        self.gid = gid
+        self.children = children
+
+
+class _MemoryEntry:
+    """DirEntry-like view of a MemoryBackend object."""
+
+    __slots__ = ('name', 'path', '_node', '_backend')
+
+    def __init__(self, name, path, node, backend):
+        self.name = name
+        self.path = path
+        self._node = node
+        self._backend = backend
+
+    def is_dir(self, follow_symlinks=True):
+        """Get whether entry is a directory."""
+        # pylint: disable=unused-argument
+        return self._node.children is not None
+
+    def is_file(self, follow_symlinks=True):
+        """Get whether entry is a file."""
+        # pylint: disable=unused-argument
+        return self._node.children is None
+
+    def is_symlink(self):
+        """Get whether entry is a symlink (never, in memory)."""
+        return False
+
+    def inode(self):
+        """Get inode number of entry."""
+        return self._node.ino
+
+    def stat(self, follow_symlinks=True):
+        """Get stat result of entry."""
+        # pylint: disable=unused-argument
+        # pylint: disable=protected-access
+        return self._backend._stat_node(self._node)
+
+
+class MemoryBackend(PosixBackend):
+    """Backend keeping a virtual tree in memory.
+
+    Useful for benchmarking traversal and mode computation without disk I/O
+    and for deterministic tests. Paths are normalized so relative and
+    absolute paths name the same object. Operations are counted in ``ops``
+    (eg, ``ops['chmod']``).
+
+    To mimic slow or shared filesystems, each operation can be made to
+    take latency seconds, with at most capacity operations served at once
+    (others wait their turn)."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    name = 'memory'
+
+    def __init__(self, uid=0, gid=0, latency=0.0, capacity=None):
+        self.uid = uid
+        self.gid = gid
+        self.users = {uid: 'root'}
+        self.groups = {gid: 'root'}
+        self.latency = latency
+        self.ops = collections.Counter()
+        self._ops_lock = threading.Lock()
+        self._capacity = threading.Semaphore(capacity or sys.maxsize)
+        self._next_ino = 1
+        self._modes = {}
+        self._links = {}
+        self.xattrs = {}
+        self._root = self._new_node(0o755, {})
+
+    def _new_node(self, mode, children=None):
+        """Create a node with the next inode number."""
+        node = _MemoryNode(self._intern_mode(mode), self._next_ino, self.uid,
+                           self.gid, children)
+        self._next_ino += 1
+        return node
+
+    def _intern_mode(self, mode):
+        """Get a shared int for mode so nodes do not each hold their own."""
+        mode = stat.S_IMODE(mode)
+        return self._modes.setdefault(mode, mode)
+
+    @staticmethod
+    def _split(path):
+        """Get the name components of a path."""
+        return [name for name in os.path.normpath(path).split(os.sep)
+                if name and name != '.']
+
+    def _lookup(self, path):
+        """Get node of a path, raising FileNotFoundError if missing."""
+        node = self._root
+        for name in self._split(path):
+            if node.children is None or name not in node.children:
+                raise FileNotFoundError(
+                    errno.ENOENT, os.strerror(errno.ENOENT), path)
+            node = node.children[name]
+        return node
+
+    def _add(self, path, mode, children):
+        """Add object at path, creating missing parent directories."""
+        names = self._split(path)
+        if not names:
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), path)
+
+        node = self._root
+        for name in names[:-1]:
+            if name not in node.children:
+                node.children[name] = self._new_node(0o755, {})
+            node = node.children[name]
+            if node.children is None:
+                raise NotADirectoryError(
+                    errno.ENOTDIR, os.strerror(errno.ENOTDIR), path)
+
+        if names[-1] in node.children:
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), path)
+        node.children[names[-1]] = self._new_node(mode, children)
+
+    def add_dir(self, path, mode=0o755):
+        """Add directory (and any missing parents) to the tree."""
+        self._add(path, mode, {})
+
+    def add_file(self, path, mode=0o644):
+        """Add file (and any missing parent directories) to the tree."""
+        self._add(path, mode, None)
+
+    def add_link(self, target, path):
+        """Add hard link at path to the existing file target."""
+        node = self._lookup(target)
+        if node.children is not None:
+            raise IsADirectoryError(
+                errno.EISDIR, os.strerror(errno.EISDIR), target)
+        names = self._split(path)
+        parent = self._lookup(os.sep.join(names[:-1]) or os.sep)
+        if parent.children is None:
+            raise NotADirectoryError(
+                errno.ENOTDIR, os.strerror(errno.ENOTDIR), path)
+        if names[-1] in parent.children:
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), path)
+        parent.children[names[-1]] = node
+        # link counts are only kept for linked files, to keep nodes small
+        self._links[node.ino] = self._links.get(node.ino, 1) + 1
+
+    def populate(self, path, depth, dirs_per_dir, files_per_dir, *,
+                 mode=0o644, dir_mode=0o755):
+        """Add a synthetic tree at path and return the number of objects.
+
+        Every directory down to depth levels below path gets dirs_per_dir
+        subdirectories and files_per_dir files."""
+        # pylint: disable=too-many-arguments
+        self.add_dir(path, dir_mode)
+        count = 1
+        level = [path]
+        for current_depth in range(depth + 1):
+            next_level = []
+            for dir_path in level:
+                for index in range(files_per_dir):
+                    self.add_file(
+                        os.path.join(dir_path, 'file%d' % index), mode)
+                    count += 1
+                if current_depth == depth:
+                    continue
+                for index in range(dirs_per_dir):
+                    sub_path = os.path.join(dir_path, 'dir%d' % index)
+                    self.add_dir(sub_path, dir_mode)
+                    next_level.append(sub_path)
+                    count += 1
+            level = next_level
+        return count
+
+    def _count(self, operation):
+        """Count an operation, safely across threads, and add latency."""
+        with self._ops_lock:
+            self.ops[operation] += 1
+
+        if self.latency:
+            with self._capacity:
+                time.sleep(self.latency)
+
+    def _stat_node(self, node):
+        """Get os.stat_result-like tuple for node."""
+        self._count('stat')
+        file_type = stat.S_IFREG if node.children is None else stat.S_IFDIR
+        return os.stat_result((
+            file_type | node.mode, node.ino, 0, self._links.get(node.ino, 1),
+            node.uid, node.gid, 0, 0, 0, 0))
+
+    def exists(self, path):
+        """Get whether object exists."""
+        try:
+            self._lookup(path)
+        except OSError:
+            return False
+        return True
+
+    def get_object_type(self, path):
+        """Get whether object is file or directory."""
+        try:
+            node = self._lookup(path)
+        except OSError:
+            return DIRECTORY
+        return DIRECTORY if node.children is not None else FILE
+
+    def stat(self, path, follow_symlinks=True):
+        """Get stat result of object."""
+        return self._stat_node(self._lookup(path))
+
+    def scandir(self, path):
+        """Iterate over DirEntry-like objects in a directory."""
+        node = self._lookup(path)
+        if node.children is None:
+            raise NotADirectoryError(
+                errno.ENOTDIR, os.strerror(errno.ENOTDIR), path)
+        self._count('scandir')
+        for name, child in node.children.items():
+            yield _MemoryEntry(name, os.path.join(path, name), child, self)
+
+    def _get_full_mode(self, path):
+        """Get mode of object, including setuid, setgid and sticky bits."""
+        return stat.S_IMODE(self.stat(path).st_mode)
+
+    def set_mode(self, path, mode, templates=None):
+        """Set bitwise mode (stat) of object."""
+        node = self._lookup(path)
+        self._count('chmod')
+        node.mode = self._intern_mode(mode)
+
+    def get_xattr(self, path, name):
+        """Get extended attribute of object."""
+        node = self._lookup(path)
+        self._count('getxattr')
+        try:
+            return self.xattrs[node.ino, name]
+        except KeyError as exc:
+            raise OSError(
+                errno.ENODATA, os.strerror(errno.ENODATA), path) from exc
+
+    def set_xattr(self, path, name, value):
+        """Set extended attribute of object."""
+        node = self._lookup(path)
+        self._count('setxattr')
+        self.xattrs[node.ino, name] = value
+
+    def get_owner(self, path):
+        """Get the object owner."""
+        uid = self._lookup(path).uid
+        return self.users.get(uid, str(uid))
+
+    def get_group(self, path):
+        """Get the object group."""
+        gid = self._lookup(path).gid
+        return self.groups.get(gid, str(gid))
+
+
+POSIX_BACKEND = PosixBackend()
+WINDOWS_BACKEND = WindowsBackend()
+
+_BACKEND = None
+
+
+def get_backend():
+    """Get the backend public functions dispatch through."""
+    if _BACKEND is not None:
+        return _BACKEND
+    if IS_WINDOWS:
+        return WINDOWS_BACKEND
+    return POSIX_BACKEND
+
+
+def set_backend(backend):
+    """Set the backend public functions dispatch through.
+
+    Passing None restores the platform default. Returns previous backend
+    setting."""
+    global _BACKEND  # pylint: disable=global-statement
+    previous = _BACKEND
+    _BACKEND = backend
+    return previous
+
+
+@contextlib.contextmanager
+def use_backend(backend):
+    """Context manager that dispatches through backend within its block."""
+    previous = set_backend(backend)
+    try:
+        yield backend
+    finally:
+        set_backend(previous)
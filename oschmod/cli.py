@@ -4,24 +4,267 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals, with_statement)
 
 import argparse
+import signal
+import sys
 
 import oschmod
+import oschmod_client
+
+
+# options only handled by running locally, not by a daemon
+LOCAL_OPTIONS = ('no_daemon', 'reference', 'stats', 'profile',
+                 'profile_folded', 'max_ops', 'pausable', 'low_priority',
+                 'acl', 'dedupe_hardlinks', 'inode_order')
+
+# counters kept by recursive runs setting modes and copying them
+SET_COUNTERS = ('visited', 'deduplicated')
+COPY_COUNTERS = ('visited', 'changed', 'unchanged', 'missing', 'errors')
 
 
 def main():
     """Provide main function for CLI."""
+    subcommands = {'watch': watch_main, 'serve': serve_main, 'tar': tar_main}
+    if sys.argv[1:2] and sys.argv[1] in subcommands:
+        subcommands[sys.argv[1]](sys.argv[2:])
+        return
+
+    parser = _get_parser()
+    args = parser.parse_args()
+    obj = _get_object(parser, args)
+
+    if not any(getattr(args, name) for name in LOCAL_OPTIONS):
+        if oschmod_client.send(args.R, obj, args.mode, args.workers):
+            return
+
+    if args.low_priority:
+        oschmod.lower_io_priority()
+
+    if args.R:
+        _run_recursive(args, obj)
+    elif args.reference:
+        oschmod.set_mode(obj, oschmod.get_mode(args.reference))
+    else:
+        oschmod.set_mode(obj, args.mode)
+        if args.acl:
+            # pylint: disable=import-outside-toplevel
+            from oschmod import acl
+            acl.set_acl(obj, args.acl)
+
+
+def _get_parser():
+    """Get parser of the main command's arguments."""
     parser = argparse.ArgumentParser(
         description='Change the mode (permissions) of a file or directory')
     parser.add_argument('-R', action='store_true',
                         help='apply mode recursively')
     parser.add_argument(
-        'mode', nargs=1, help='octal or symbolic mode of the object')
-    parser.add_argument('object', nargs=1, help='file or directory')
+        '--reference', metavar='RFILE',
+        help="use RFILE's mode instead of a mode value; with -R, copy modes "
+             "of objects under RFILE to matching objects under object")
+    parser.add_argument(
+        '--workers', type=_workers, default=oschmod.DEFAULT_WORKERS,
+        help='with -R, number of objects to work on concurrently, or "auto" '
+             'to adjust to the filesystem as the run goes (default: '
+             '%(default)s)')
+    parser.add_argument(
+        '--stats', action='store_true',
+        help='with -R, print counts and concurrency decisions when done')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='with -R, print the slowest subtrees when done')
+    parser.add_argument(
+        '--profile-folded', metavar='FILE',
+        help='with -R, write time spent in each directory to FILE as '
+             'folded stacks for flame graph tools')
+    parser.add_argument(
+        '--max-ops', type=float, metavar='N',
+        help='with -R, do at most N metadata operations per second; '
+             'implies --pausable')
+    parser.add_argument(
+        '--pausable', action='store_true',
+        help='with -R, pause on SIGUSR1 and resume on SIGUSR2')
+    parser.add_argument(
+        '--low-priority', action='store_true',
+        help='lower the I/O priority of this process, or its CPU priority '
+             'where that cannot be set')
+    parser.add_argument(
+        '--dedupe-hardlinks', action='store_true',
+        help='with -R, set files with several hard links once')
+    parser.add_argument(
+        '--inode-order', action='store_true',
+        help='with -R, set files in inode order rather than listing order '
+             '(can be faster on spinning disks when metadata is not cached)')
+    parser.add_argument(
+        '--acl', metavar='SPEC',
+        help='also set POSIX ACL (Linux only) in setfacl syntax, eg, '
+             '"g:devs:rwX,d:g:devs:rwX"; default entries are set on '
+             'directories only')
+    parser.add_argument(
+        '--no-daemon', action='store_true',
+        help='do not send the request to a running "oschmod serve" daemon')
+    parser.add_argument(
+        'mode', nargs='?', help='octal or symbolic mode of the object')
+    parser.add_argument('object', nargs='?', help='file or directory')
 
-    args = parser.parse_args()
-    mode = args.mode[0]
-    obj = args.object[0]
-    if args.R:
-        oschmod.set_mode_recursive(obj, mode)
+    return parser
+
+
+def _get_object(parser, args):
+    """Check arguments go together and get the object to change."""
+    obj = args.object
+    if args.reference:
+        # with a reference, the only positional argument is the object
+        if obj is not None:
+            parser.error('mode cannot be used with --reference')
+        obj = args.mode
+        if args.acl:
+            parser.error('--acl cannot be used with --reference')
+        if args.profile or args.profile_folded:
+            parser.error('--profile cannot be used with --reference')
+    if obj is None:
+        parser.error('the following arguments are required: %s' % (
+            'object' if args.reference or args.mode else 'mode, object'))
+    return obj
+
+
+def _run_recursive(args, obj):
+    """Set or copy modes at and under object, then print reports."""
+    # without a throttle, operations go straight to the backend
+    throttle = None
+    if args.max_ops or args.pausable:
+        throttle = oschmod.Throttle(args.max_ops)
+        if hasattr(signal, 'SIGUSR1'):
+            throttle.install_signal_handlers()
+    stats = oschmod.Stats()
+    profiler = None
+    if args.profile or args.profile_folded:
+        profiler = oschmod.Profiler()
+
+    if args.reference:
+        oschmod.copy_modes_recursive(
+            args.reference, obj, workers=args.workers, stats=stats,
+            throttle=throttle)
     else:
-        oschmod.set_mode(obj, mode)
+        oschmod.set_mode_recursive(
+            obj, args.mode, throttle=throttle, workers=args.workers,
+            stats=stats, profiler=profiler, acl=args.acl,
+            dedupe_hardlinks=args.dedupe_hardlinks,
+            inode_order=args.inode_order)
+
+    _print_reports(args, stats, profiler)
+
+
+def _print_reports(args, stats, profiler):
+    """Print counters and profile of a recursive run, as requested."""
+    if args.stats:
+        for elapsed, message in stats.events:
+            print('%8.3fs %s' % (elapsed, message), file=sys.stderr)
+        counters = COPY_COUNTERS if args.reference else SET_COUNTERS
+        print(', '.join('%s: %d' % (name, getattr(stats, name))
+                        for name in counters), file=sys.stderr)
+
+    if profiler is None:
+        return
+    if args.profile:
+        print(profiler.report(), file=sys.stderr)
+    if args.profile_folded:
+        with open(args.profile_folded, 'w') as folded:
+            profiler.write_folded(folded)
+
+
+def _workers(value):
+    """Get number of workers (or "auto") from command line argument."""
+    if value == oschmod.AUTO_WORKERS:
+        return value
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(
+            'must be an integer or "%s"' % oschmod.AUTO_WORKERS) from exc
+
+
+def watch_main(argv):
+    """Provide CLI for continuously applying modes to new objects."""
+    # pylint: disable=import-outside-toplevel
+    from oschmod import watch
+
+    parser = argparse.ArgumentParser(
+        prog='oschmod watch',
+        description='Watch a directory tree (Linux only) and change the '
+                    'mode of files and directories created in or moved '
+                    'into it')
+    parser.add_argument(
+        '--dir-mode', metavar='MODE',
+        help='octal or symbolic mode of new directories (default: mode)')
+    parser.add_argument(
+        '--scan', action='store_true',
+        help='apply modes to the existing tree once before watching')
+    parser.add_argument(
+        'mode', help='octal or symbolic mode of new objects')
+    parser.add_argument('directory', help='directory to watch')
+
+    args = parser.parse_args(argv)
+    # watch before scanning, so objects created during the scan are caught
+    with watch.Watcher(args.directory, args.mode, args.dir_mode) as watcher:
+        if args.scan:
+            oschmod.set_mode_recursive(
+                args.directory, args.mode, args.dir_mode)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+
+
+def serve_main(argv):
+    """Provide CLI for serving requests from other oschmod processes."""
+    # pylint: disable=import-outside-toplevel
+    from oschmod import daemon
+
+    parser = argparse.ArgumentParser(
+        prog='oschmod serve',
+        description='Serve oschmod requests on a Unix domain socket so '
+                    'frequent oschmod commands run in one warm process; '
+                    'oschmod uses a running daemon automatically')
+    parser.add_argument(
+        '--socket', metavar='PATH',
+        help='path of the socket (default: $OSCHMOD_SOCKET, or '
+             'oschmod.sock in $XDG_RUNTIME_DIR, or in a private /tmp/'
+             'oschmod-UID directory)')
+
+    args = parser.parse_args(argv)
+    try:
+        daemon.serve(args.socket)
+    except KeyboardInterrupt:
+        pass
+
+
+def tar_main(argv):
+    """Provide CLI for setting modes of members of tar archives."""
+    # pylint: disable=import-outside-toplevel
+    from oschmod import archive
+
+    parser = argparse.ArgumentParser(
+        prog='oschmod tar',
+        description='Copy a tar archive, changing the modes of its members '
+                    'as "oschmod -R" would, without extracting it')
+    parser.add_argument(
+        '--dir-mode', metavar='MODE',
+        help='octal or symbolic mode of directories (default: mode)')
+    parser.add_argument(
+        '--compress', choices=('gz', 'bz2', 'xz', 'none'),
+        help='compression of the new archive (default: from its name)')
+    parser.add_argument('mode', help='octal or symbolic mode of files')
+    parser.add_argument('src', help='archive to read, or - for stdin')
+    parser.add_argument('dst', help='archive to write, or - for stdout')
+
+    args = parser.parse_args(argv)
+    if args.src == args.dst != '-':
+        parser.error('src and dst must be different archives')
+
+    compression = args.compress
+    if compression == 'none':
+        compression = ''
+    archive.set_mode_tar(
+        sys.stdin.buffer if args.src == '-' else args.src,
+        sys.stdout.buffer if args.dst == '-' else args.dst,
+        args.mode, args.dir_mode, compression)
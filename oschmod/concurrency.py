@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""oschmod concurrency module.
+
+Work on the objects of a recursive run with a pool of threads, with a
+fixed number of workers or a number adjusted to what the filesystem can
+serve.
+"""
+
+import queue
+import threading
+import time
+
+from oschmod.constants import DIRECTORY, FILE
+
+BATCH_SIZE = 1000
+DEFAULT_WORKERS = 1
+AUTO_WORKERS = 'auto'
+AUTO_MAX_WORKERS = 64
+AUTO_WINDOW = 32
+
+
+class ConcurrencyController:
+    """Adjust the number of operations in flight to the filesystem.
+
+    Latency and throughput are measured over windows of completed
+    operations. While more operations in flight bring more throughput, or
+    at least do not raise latency much above the lowest seen, the limit
+    grows by one (additive increase). When latency climbs past tolerance
+    times the lowest seen without any gain in throughput, the limit is
+    halved (multiplicative decrease). Decisions are logged to stats, if
+    given, and kept in ``history`` as (limit, throughput, latency)."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, initial=2, minimum=1, maximum=AUTO_MAX_WORKERS,
+                 tolerance=1.5, stats=None):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.stats = stats
+        self.history = []
+        self._baseline = None
+        self._throughput = 0.0
+        self._start = None
+        self._latency = 0.0
+        self._count = 0
+
+    def record(self, latency):
+        """Record latency of a completed operation, adjusting if due."""
+        now = time.time()
+        if self._start is None:
+            self._start = now - latency
+        self._latency += latency
+        self._count += 1
+
+        if self._count < max(AUTO_WINDOW, 4 * self.limit):
+            return
+
+        throughput = self._count / max(now - self._start, 1e-9)
+        latency = self._latency / self._count
+        self._start = now
+        self._latency = 0.0
+        self._count = 0
+        self._adjust(throughput, latency)
+
+    def skip(self, seconds):
+        """Leave seconds with no operations in flight out of the window.
+
+        Otherwise time spent between batches, listing directories or
+        setting their modes, would count against throughput."""
+        if self._start is not None:
+            self._start += seconds
+
+    def _adjust(self, throughput, latency):
+        """Change limit given throughput and latency at current limit."""
+        # let the baseline creep up so it follows slow changes in conditions
+        if self._baseline is None:
+            self._baseline = latency
+        self._baseline = min(latency, self._baseline * 1.01)
+
+        previous = self.limit
+        if latency > self.tolerance * self._baseline and \
+                throughput < self._throughput * 1.05:
+            self.limit = max(self.minimum, self.limit // 2)
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+        self._throughput = throughput
+
+        self.history.append((previous, throughput, latency))
+        if self.stats is not None and self.limit != previous:
+            self.stats.log(
+                'concurrency %d -> %d: %.0f ops/s, %.2f ms latency' % (
+                    previous, self.limit, throughput, latency * 1000))
+
+
+class _Pool:
+    """Threads calling functions on the items handed to them.
+
+    Results come back in the order calls finish. Calls already handed
+    over are finished before the pool is closed, even after an error."""
+
+    def __init__(self, workers):
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Finish calls handed over and stop threads."""
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        """Make calls until told to stop."""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            function, item = task
+            try:
+                self._results.put((function(item), None))
+            except Exception as exc:  # pylint: disable=broad-except
+                self._results.put((None, exc))
+
+    def submit(self, function, item):
+        """Hand over a call of function on item."""
+        self._tasks.put((function, item))
+
+    def result(self):
+        """Wait for a call to finish and get its result, raising its error."""
+        result, error = self._results.get()
+        if error is not None:
+            raise error
+        return result
+
+    def map(self, function, items):
+        """Call function on items and wait for all calls to finish."""
+        count = 0
+        for item in items:
+            self.submit(function, item)
+            count += 1
+        for _ in range(count):
+            self.result()
+
+
+def _batched(items, size):
+    """Yield lists of up to size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _apply(items, operation, workers=1, stats=None):
+    """Call operation on (object type, ...) items of a bottom-up walk.
+
+    With several workers, items are taken in batches. Files of a batch are
+    worked on concurrently, then directories in walk order, so a directory's
+    mode is only set once everything below it is done. workers can be
+    "auto" or a ConcurrencyController to adjust concurrency as it runs."""
+    controller = None
+    if workers == AUTO_WORKERS:
+        workers = ConcurrencyController(stats=stats)
+    if isinstance(workers, ConcurrencyController):
+        controller = workers
+        if controller.stats is None:
+            controller.stats = stats
+        workers = controller.maximum
+
+    if workers <= 1:
+        for item in items:
+            operation(item)
+        return
+
+    idle_since = None
+    with _Pool(workers) as pool:
+        for batch in _batched(items, BATCH_SIZE):
+            files = [item for item in batch if item[0] == FILE]
+            if controller is None:
+                pool.map(operation, files)
+            else:
+                if idle_since is not None:
+                    controller.skip(time.time() - idle_since)
+                _apply_adaptive(pool, operation, files, controller)
+            for item in batch:
+                if item[0] == DIRECTORY:
+                    operation(item)
+            idle_since = time.time()
+
+
+def _apply_adaptive(pool, operation, items, controller):
+    """Call operation on items, keeping controller.limit of them in flight."""
+    def timed(item):
+        """Call operation and get its latency."""
+        start = time.time()
+        operation(item)
+        return time.time() - start
+
+    items = iter(items)
+    in_flight = 0
+    more = True
+    while more or in_flight:
+        while more and in_flight < controller.limit:
+            item = next(items, None)
+            if item is None:
+                more = False
+            else:
+                pool.submit(timed, item)
+                in_flight += 1
+
+        if in_flight:
+            in_flight -= 1
+            controller.record(pool.result())
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""oschmod constants module.
+
+Object, owner and permission types shared by oschmod's modules.
+"""
+
+import platform
+import stat
+
+IS_WINDOWS = platform.system() == 'Windows'
+
+FILE = 0
+DIRECTORY = 1
+
+OBJECT_TYPES = [FILE, DIRECTORY]
+
+OWNER = 0
+GROUP = 1
+OTHER = 2
+
+OWNER_TYPES = [OWNER, GROUP, OTHER]
+
+READ = 0
+WRITE = 1
+EXECUTE = 2
+
+OPER_TYPES = [READ, WRITE, EXECUTE]
+
+STAT_MODES = [
+    [stat.S_IRUSR, stat.S_IWUSR, stat.S_IXUSR],
+    [stat.S_IRGRP, stat.S_IWGRP, stat.S_IXGRP],
+    [stat.S_IROTH, stat.S_IWOTH, stat.S_IXOTH]
+]
+
+STAT_KEYS = (
+    "S_IRUSR",
+    "S_IWUSR",
+    "S_IXUSR",
+    "S_IRGRP",
+    "S_IWGRP",
+    "S_IXGRP",
+    "S_IROTH",
+    "S_IWOTH",
+    "S_IXOTH"
+)
+
+SYMBOLIC_SHIFTS = {"u": 6, "g": 3, "o": 0}
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""oschmod daemon module.
+
+Serve oschmod operations over a Unix domain socket so that frequent,
+short-lived callers avoid repeating start-up work and share warm caches
+(parsed modes, user and group names) across requests.
+
+The protocol is one JSON object per line. A request names an operation
+and its arguments, for example::
+
+    {"op": "set_mode", "path": "/srv/data/file", "mode": "u+x"}
+
+and the response is either ``{"ok": true, "result": ...}`` or
+``{"ok": false, "error": "...", "errno": 2, "filename": "..."}``.
+Clients are made by ``connect()``, from the ``oschmod_client`` module.
+"""
+
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+import oschmod
+from oschmod import DIRECTORY, FILE
+from oschmod_client import connect, private_tmp_dir, socket_path
+
+HAS_UNIX_SOCKETS = hasattr(socket, 'AF_UNIX')
+
+OPERATIONS = ('set_mode', 'set_mode_recursive', 'get_mode', 'scan')
+
+
+def set_mode(path, mode):
+    """Set mode of object."""
+    oschmod.set_mode(path, mode)
+
+
+def set_mode_recursive(path, mode, dir_mode=None,
+                       workers=oschmod.DEFAULT_WORKERS):
+    """Set modes of objects at or under path and return counters."""
+    return oschmod.set_mode_recursive(
+        path, mode, dir_mode, workers=workers).as_dict()
+
+
+def get_mode(path):
+    """Get mode of object."""
+    return oschmod.get_mode(path)
+
+
+def scan(path):
+    """Count objects at or under path by type and octal mode.
+
+    Returns {"file": {"644": count, ...}, "directory": {...}}."""
+    counts = {'file': {}, 'directory': {}}
+
+    def count(object_type, mode):
+        """Count one object."""
+        by_mode = counts['file' if object_type == FILE else 'directory']
+        key = '%o' % mode
+        by_mode[key] = by_mode.get(key, 0) + 1
+
+    backend = oschmod.get_backend()
+    object_type = backend.get_object_type(path)
+    count(object_type, backend.get_mode(path))
+    if object_type == DIRECTORY:
+        # pylint: disable=protected-access
+        for object_type, _, entry in oschmod._iter_tree(path, backend):
+            if entry.is_symlink():
+                continue
+            try:
+                count(object_type, backend.get_entry_mode(entry))
+            except OSError:
+                continue
+    return counts
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answer requests from one client connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.dispatch(line)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    r"""
+    Serve oschmod operations on a Unix domain socket.
+
+    Args:
+    path: (:obj:`str`)
+        Path of the socket. The socket is only accessible to the user
+        running the server, as operations run with that user's rights.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path=None):
+        if not HAS_UNIX_SOCKETS:
+            raise OSError(errno.ENOSYS, 'Unix domain sockets not available')
+        self.path = path or socket_path()
+        self.requests = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path) == private_tmp_dir():
+            _make_private_dir(private_tmp_dir())
+        if os.path.lexists(self.path):
+            client = connect(self.path)
+            if client is not None:
+                client.close()
+                raise OSError(errno.EADDRINUSE,
+                              'daemon already running', self.path)
+            if not stat.S_ISSOCK(os.lstat(self.path).st_mode):
+                raise OSError(errno.EEXIST, 'not a socket', self.path)
+            # left behind by a daemon that did not shut down cleanly
+            os.unlink(self.path)
+
+        umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.__init__(self, self.path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def dispatch(self, line):
+        """Run request given as a JSON line and get response."""
+        with self._lock:
+            self.requests += 1
+        try:
+            request = json.loads(line.decode('utf-8'))
+            operation = request.pop('op')
+            if operation not in OPERATIONS:
+                raise ValueError('unknown operation: %s' % operation)
+            result = globals()[operation](**request)
+        except OSError as err:
+            return {'ok': False, 'error': err.strerror or str(err),
+                    'errno': err.errno, 'filename': err.filename}
+        except (AttributeError, KeyError, TypeError, ValueError) as err:
+            return {'ok': False, 'error': str(err)}
+        return {'ok': True, 'result': result}
+
+
+def _make_private_dir(path):
+    """Create directory only the user can use, or check an existing one."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or \
+            info.st_mode & 0o077:
+        raise OSError(errno.EPERM, 'socket directory is not private', path)
+
+
+def serve(path=None):
+    """Serve requests until interrupted."""
+    server = Server(path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
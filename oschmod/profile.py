@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""oschmod profile module.
+
+Find where the time of a recursive run goes: time spent listing, stat-ing
+and changing modes is recorded per directory and reported by subtree or
+as folded stacks for flame graphs.
+"""
+
+import os
+import threading
+import time
+
+
+class Profiler:
+    """Per-directory latency profile of a recursive run.
+
+    For each directory, the number of entries listed and the seconds spent
+    listing and stat-ing (``stat``) and changing modes (``chmod``) of the
+    objects in it are kept in ``directories`` as [entries, stat, chmod].
+    Times are summed across workers. Subtree totals are computed when
+    reported."""
+
+    STAT_OPERATIONS = ('stat', 'get_mode', '_get_full_mode',
+                       'get_object_type', 'exists', 'get_owner', 'get_group')
+    CHMOD_OPERATIONS = ('set_mode', 'set_xattr')
+
+    def __init__(self):
+        self.root = None
+        self.directories = {}
+        self._lock = threading.Lock()
+
+    def record(self, directory, stat_seconds=0.0, chmod_seconds=0.0,
+               entries=0):
+        """Add time and entries to a directory, safely across threads."""
+        with self._lock:
+            totals = self.directories.get(directory)
+            if totals is None:
+                totals = self.directories[directory] = [0, 0.0, 0.0]
+            totals[0] += entries
+            totals[1] += stat_seconds
+            totals[2] += chmod_seconds
+
+    def subtrees(self):
+        """Get {directory: [entries, stat, chmod]} including subtrees."""
+        with self._lock:
+            directories = list(self.directories.items())
+
+        totals = {}
+        for directory, own in directories:
+            path = directory
+            while True:
+                total = totals.setdefault(path, [0, 0.0, 0.0])
+                total[0] += own[0]
+                total[1] += own[1]
+                total[2] += own[2]
+                parent = os.path.dirname(path) or os.curdir
+                if path in (self.root, parent):
+                    break
+                path = parent
+        return totals
+
+    def top(self, count=10):
+        """Get (directory, entries, stat, chmod) of slowest subtrees."""
+        totals = sorted(
+            self.subtrees().items(),
+            key=lambda item: (item[1][1] + item[1][2], item[0]),
+            reverse=True)
+        return [(path, total[0], total[1], total[2])
+                for path, total in totals[:count]]
+
+    def report(self, count=10):
+        """Get text report of the slowest subtrees."""
+        lines = ['%9s %9s %9s %9s  %s' % (
+            'seconds', 'stat', 'chmod', 'entries', 'subtree')]
+        for path, entries, stat_seconds, chmod_seconds in self.top(count):
+            lines.append('%9.3f %9.3f %9.3f %9d  %s' % (
+                stat_seconds + chmod_seconds, stat_seconds, chmod_seconds,
+                entries, path))
+        return '\n'.join(lines)
+
+    def write_folded(self, file):
+        """Write directories' own times as folded stacks for flame graphs.
+
+        Each line is the path components of a directory, separated by
+        semicolons, and its time in microseconds, as read by flamegraph.pl
+        and similar tools."""
+        with self._lock:
+            directories = sorted(self.directories.items())
+
+        for directory, own in directories:
+            microseconds = int(round((own[1] + own[2]) * 1e6))
+            if not microseconds:
+                continue
+            frames = [self.root]
+            relative = os.path.relpath(directory, self.root)
+            if relative != os.curdir:
+                frames.extend(relative.split(os.sep))
+            file.write('%s %d\n' % (
+                ';'.join(frame.replace(';', '_') for frame in frames),
+                microseconds))
+
+
+class _ProfiledBackend:
+    """Backend wrapper timing operations for a profiler.
+
+    Time is charged to the directory containing the object operated on,
+    except for the profiled root itself and directory listings, which are
+    charged to the directory listed."""
+
+    def __init__(self, backend, profiler):
+        self.backend = backend
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        attribute = getattr(self.backend, name)
+        if name in Profiler.STAT_OPERATIONS:
+            field = 'stat_seconds'
+        elif name in Profiler.CHMOD_OPERATIONS:
+            field = 'chmod_seconds'
+        else:
+            return attribute
+
+        def profiled(path, *args, **kwargs):
+            """Call backend method, recording time taken."""
+            start = time.time()
+            try:
+                return attribute(path, *args, **kwargs)
+            finally:
+                self.profiler.record(
+                    self._directory(path), **{field: time.time() - start})
+
+        return profiled
+
+    def _directory(self, path):
+        """Get directory to charge operations on path to."""
+        path = os.path.normpath(path)
+        if path == self.profiler.root:
+            return path
+        return os.path.dirname(path) or os.curdir
+
+    def scandir(self, path):
+        """Yield entries of directory, recording time and count."""
+        elapsed = 0.0
+        entries = 0
+        iterator = iter(self.backend.scandir(path))
+        try:
+            while True:
+                start = time.time()
+                try:
+                    entry = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.time() - start
+                entries += 1
+                yield entry
+        finally:
+            self.profiler.record(
+                os.path.normpath(path), stat_seconds=elapsed, entries=entries)
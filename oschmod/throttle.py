@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""oschmod throttle module.
+
+Limit the load recursive runs put on shared filesystems: cap metadata
+operations per second, pause and resume runs, and lower the process's
+I/O priority.
+"""
+
+import os
+import platform
+import signal
+import threading
+import time
+
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_SET_SYSCALLS = {
+    'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314,
+    'ppc64le': 273, 's390x': 282}
+
+
+class Throttle:
+    """Limit metadata operations per second and let runs be paused.
+
+    A token bucket holding up to one second of operations is refilled at
+    max_ops tokens per second and each operation takes a token, waiting if
+    none is left. With no max_ops, operations are only held while paused.
+    ``waited`` and ``paused_seconds`` tell how long operations were held."""
+
+    def __init__(self, max_ops=None):
+        self.max_ops = max_ops
+        self.waited = 0.0
+        self.paused_seconds = 0.0
+        self._tokens = float(max_ops or 0)
+        self._last = time.time()
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def paused(self):
+        """Get whether operations are paused."""
+        return not self._running.is_set()
+
+    def pause(self):
+        """Hold operations until resumed."""
+        self._running.clear()
+
+    def resume(self):
+        """Let held operations continue."""
+        self._running.set()
+
+    def install_signal_handlers(self, pause_signal=None, resume_signal=None):
+        """Pause on pause_signal and resume on resume_signal.
+
+        Defaults to SIGUSR1 and SIGUSR2. Must be called from the main
+        thread and only works on platforms with those signals."""
+        signal.signal(
+            pause_signal or signal.SIGUSR1, lambda *_: self.pause())
+        signal.signal(
+            resume_signal or signal.SIGUSR2, lambda *_: self.resume())
+
+    def acquire(self, count=1):
+        """Wait until count operations may be done."""
+        if not self._running.is_set():
+            start = time.time()
+            self._running.wait()
+            self.paused_seconds += time.time() - start
+
+        if not self.max_ops:
+            return
+
+        with self._lock:
+            now = time.time()
+            self._tokens = min(
+                float(self.max_ops),
+                self._tokens + (now - self._last) * self.max_ops)
+            self._last = now
+            # take tokens now, even if that leaves the bucket in debt, so
+            # concurrent callers queue up behind each other
+            self._tokens -= count
+            wait = -self._tokens / self.max_ops
+
+        if wait > 0:
+            self.waited += wait
+            time.sleep(wait)
+
+
+class _ThrottledBackend:
+    """Backend wrapper taking a throttle token for each operation.
+
+    Operations are wrapped once, when the wrapper is made, so each call
+    only costs the token. Other attributes are the backend's own."""
+
+    # pylint: disable=too-few-public-methods
+
+    OPERATIONS = ('exists', 'get_object_type', 'stat', 'scandir', 'get_mode',
+                  'get_entry_mode', '_get_full_mode', '_get_full_entry_mode',
+                  'set_mode', 'get_xattr', 'set_xattr', 'get_owner',
+                  'get_group')
+
+    def __init__(self, backend, throttle):
+        self.backend = backend
+        self.throttle = throttle
+        for name in self.OPERATIONS:
+            if hasattr(backend, name):
+                setattr(self, name, self._throttled(getattr(backend, name)))
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _throttled(self, operation):
+        """Get function calling operation once throttle allows."""
+        acquire = self.throttle.acquire
+
+        def throttled(*args, **kwargs):
+            """Call backend method once throttle allows."""
+            acquire()
+            return operation(*args, **kwargs)
+
+        return throttled
+
+
+def lower_io_priority(idle=False):
+    """Lower the I/O priority of this process.
+
+    On Linux, the I/O priority is set to the lowest best-effort level or,
+    if idle, to the idle class (only served when no other process needs
+    the disk). Elsewhere, or if that fails, the CPU niceness is raised as
+    far as possible instead, which still lowers I/O priority on Linux
+    schedulers that derive it from niceness. The niceness is left alone
+    when the I/O priority is set. Returns whether the I/O priority itself
+    was set."""
+    io_set = False
+    machine = platform.machine()
+    if platform.system() == 'Linux' and machine in IOPRIO_SET_SYSCALLS:
+        ioprio = (IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) if idle else \
+            (IOPRIO_CLASS_BE << IOPRIO_CLASS_SHIFT) | 7
+        try:
+            # ctypes is optional in some builds and only needed here
+            # pylint: disable=import-outside-toplevel
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            io_set = libc.syscall(
+                IOPRIO_SET_SYSCALLS[machine], IOPRIO_WHO_PROCESS, 0,
+                ioprio) == 0
+        except (AttributeError, ImportError, OSError):
+            pass
+
+    if not io_set and hasattr(os, 'nice'):
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+
+    return io_set
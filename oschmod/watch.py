@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""oschmod watch module.
+
+Continuously enforce modes on objects created in, or moved into, a tree
+using Linux inotify. Rather than rescanning a tree to find new objects,
+a watch is kept on every directory and the mode policy is applied to
+objects as their events arrive.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import time
+
+import oschmod
+from oschmod import DIRECTORY, FILE
+
+HAS_INOTIFY = False
+try:
+    _LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _LIBC.inotify_init1.argtypes = [ctypes.c_int]
+    _LIBC.inotify_add_watch.argtypes = [
+        ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    HAS_INOTIFY = True
+except (AttributeError, OSError, TypeError):
+    pass
+
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | \
+    IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+COALESCE_SECONDS = 0.1
+MAX_COALESCE_SECONDS = 1.0
+RACY_SECONDS = 2.0
+
+
+class Watcher:
+    r"""
+    Apply a mode policy to objects created in or moved into a tree.
+
+    Args:
+    path: (:obj:`str`)
+        Directory to watch, including all of its subdirectories.
+
+    mode: (`int` or `str`)
+        Mode given to new files, as in ``oschmod.set_mode_recursive()``.
+
+    dir_mode: (`int` or `str`)
+        If provided, this mode is given to new directories only.
+
+    coalesce: (`float`)
+        Seconds to wait for more events before applying modes, so that
+        repeated events for the same object result in one mode change.
+
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, path, mode, dir_mode=None,
+                 coalesce=COALESCE_SECONDS):
+        if not HAS_INOTIFY:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        self.path = path
+        self.mode = mode
+        self.dir_mode = dir_mode or mode
+        self.coalesce = coalesce
+        self.stats = oschmod.Stats()
+        self._watches = {}
+        self._scanned = {}
+        self._fd = _LIBC.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            _raise_errno(path)
+        self._watch_tree(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop watching."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._watches.clear()
+        self._scanned.clear()
+
+    @property
+    def watched(self):
+        """Get paths of watched directories."""
+        return sorted(self._watches.values())
+
+    def run(self, stop_event=None, timeout=0.5):
+        """Apply modes as events arrive until stop_event (if given) is set."""
+        while stop_event is None or not stop_event.is_set():
+            self.poll(timeout)
+
+    def poll(self, timeout=None):
+        """Wait up to timeout seconds for events and apply modes.
+
+        Returns the number of objects whose modes were set. A new
+        directory counts once, including everything below it."""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return 0
+
+        paths = set()
+        overflow = False
+        deadline = time.time() + MAX_COALESCE_SECONDS
+        while True:
+            for wd_path, mask, name in self._read_events():
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.add(os.path.join(wd_path, name))
+            wait = min(self.coalesce, deadline - time.time())
+            if wait <= 0 or not select.select([self._fd], [], [], wait)[0]:
+                break
+
+        changed = 0
+        for path in paths:
+            changed += self._apply(path)
+
+        if overflow:
+            # parents of the objects seen must not be marked as scanned, or
+            # the rescan would skip them and miss objects of lost events
+            self.stats.log('event queue overflowed, rescanning')
+            return changed + self.rescan()
+
+        for parent in set(os.path.dirname(path) for path in paths):
+            self._mark_scanned(parent)
+
+        return changed
+
+    def rescan(self):
+        """Apply modes in watched directories changed since last scanned.
+
+        Used when the kernel's event queue overflows and events are lost.
+        Only directories whose modification time changed are listed."""
+        changed = 0
+        for path in list(self._scanned):
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime == self._scanned.get(path):
+                continue
+
+            self._mark_scanned(path)
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        changed += self._apply(entry.path, rescan=True)
+            except OSError:
+                self.stats.add(errors=1)
+
+        return changed
+
+    def _apply(self, path, rescan=False):
+        """Apply mode policy to a new object, watching new directories."""
+        try:
+            current_mode = os.lstat(path).st_mode
+            is_dir = stat.S_ISDIR(current_mode)
+            if is_dir and path not in self._scanned:
+                return self._apply_tree(path)
+            if stat.S_ISLNK(current_mode) or (is_dir and rescan):
+                return 0
+            return self._apply_object(
+                path, stat.S_IMODE(current_mode),
+                DIRECTORY if is_dir else FILE)
+        except FileNotFoundError:
+            # object is already gone
+            return 0
+        except OSError:
+            self.stats.add(errors=1)
+            return 0
+
+    def _apply_tree(self, path):
+        """Watch a new directory and apply modes to everything in it."""
+        # objects may be created before the watch is added
+        self._watch_tree(path)
+        oschmod.set_mode_recursive(path, self.mode, self.dir_mode)
+        self.stats.add(visited=1, changed=1)
+        return 1
+
+    def _apply_object(self, path, current_mode, object_type):
+        """Set mode of an object, if the policy changes it."""
+        self.stats.add(visited=1)
+        # pylint: disable=protected-access
+        new_mode = oschmod._get_new_mode(
+            self.mode if object_type == FILE else self.dir_mode,
+            current_mode, object_type)
+        if new_mode == current_mode:
+            self.stats.add(unchanged=1)
+            return 0
+        oschmod.get_backend().set_mode(path, new_mode)
+        self.stats.add(changed=1)
+        return 1
+
+    def _watch_tree(self, path):
+        """Add watches for path and all directories below it."""
+        for root, _, _ in os.walk(path):
+            self._add_watch(root)
+
+    def _add_watch(self, path):
+        """Add a watch for a directory."""
+        wd = _LIBC.inotify_add_watch(
+            self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            _raise_errno(path)
+        self._watches[wd] = path
+        self._mark_scanned(path)
+
+    def _mark_scanned(self, path):
+        """Record directory's modification time as of its last scan.
+
+        Timestamps have limited granularity so, if the directory changed
+        very recently, more changes may not alter its modification time. To
+        be safe, such directories are rescanned next time (as None never
+        matches a modification time)."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._scanned.pop(path, None)
+            return
+        if time.time() - mtime / 1e9 < RACY_SECONDS:
+            mtime = None
+        self._scanned[path] = mtime
+
+    def _read_events(self):
+        """Yield (directory path, mask, name) of pending events."""
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_IGNORED:
+                self._scanned.pop(self._watches.pop(wd, None), None)
+            elif mask & IN_Q_OVERFLOW:
+                yield None, mask, None
+            elif wd in self._watches and name:
+                yield self._watches[wd], mask, name
+
+
+def watch(path, mode, dir_mode=None, stop_event=None):
+    """Apply mode policy to objects created under path until stopped."""
+    with Watcher(path, mode, dir_mode) as watcher:
+        watcher.run(stop_event)
+
+
+def _raise_errno(path):
+    """Raise OSError for the errno of the last libc call."""
+    error = ctypes.get_errno()
+    raise OSError(error, os.strerror(error), path)
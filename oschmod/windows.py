@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""oschmod windows module.
+
+Translate modes to and from the DACLs of Windows security descriptors,
+using pywin32.
+"""
+
+import os
+
+from oschmod.cache import LookupCache
+from oschmod.constants import (
+    DIRECTORY, FILE, GROUP, IS_WINDOWS, OPER_TYPES, OTHER, OWNER, STAT_MODES)
+
+HAS_PYWIN32 = False
+try:
+    import ntsecuritycon  # noqa: F401
+    import win32security  # noqa: F401
+    from pywintypes import error as pywinerror
+    HAS_PYWIN32 = True
+except ImportError:
+    pass
+
+if IS_WINDOWS and not HAS_PYWIN32:
+    raise ImportError("win32security and ntsecuritycon required on Windows")
+
+if HAS_PYWIN32:
+    W_FLDIR = ntsecuritycon.FILE_LIST_DIRECTORY    # =                        1
+    W_FADFL = ntsecuritycon.FILE_ADD_FILE          # =                       10
+    W_FADSD = ntsecuritycon.FILE_ADD_SUBDIRECTORY  # =                      100
+    W_FRDEA = ntsecuritycon.FILE_READ_EA           # =                     1000
+    W_FWREA = ntsecuritycon.FILE_WRITE_EA          # =                    10000
+    W_FTRAV = ntsecuritycon.FILE_TRAVERSE          # =                   100000
+    W_FDLCH = ntsecuritycon.FILE_DELETE_CHILD      # =                  1000000
+    W_FRDAT = ntsecuritycon.FILE_READ_ATTRIBUTES   # =                 10000000
+    W_FWRAT = ntsecuritycon.FILE_WRITE_ATTRIBUTES  # =                100000000
+    W_DELET = ntsecuritycon.DELETE                 # =        10000000000000000
+    W_RDCON = ntsecuritycon.READ_CONTROL           # =       100000000000000000
+    W_WRDAC = ntsecuritycon.WRITE_DAC              # =      1000000000000000000
+    W_WROWN = ntsecuritycon.WRITE_OWNER            # =     10000000000000000000
+    W_SYNCH = ntsecuritycon.SYNCHRONIZE            # =    100000000000000000000
+    W_FGNEX = ntsecuritycon.FILE_GENERIC_EXECUTE   # =    100100000000010100000
+    W_FGNRD = ntsecuritycon.FILE_GENERIC_READ      # =    100100000000010001001
+    W_FGNWR = ntsecuritycon.FILE_GENERIC_WRITE     # =    100100000000100010110
+    W_GENAL = ntsecuritycon.GENERIC_ALL         # 10000000000000000000000000000
+    W_GENEX = ntsecuritycon.GENERIC_EXECUTE    # 100000000000000000000000000000
+    W_GENWR = ntsecuritycon.GENERIC_WRITE     # 1000000000000000000000000000000
+    W_GENRD = ntsecuritycon.GENERIC_READ    # -10000000000000000000000000000000
+
+    W_DIRRD = W_FLDIR | W_FRDEA | W_FRDAT | W_RDCON | W_SYNCH
+    W_DIRWR = W_FADFL | W_FADSD | W_FWREA | W_FDLCH | W_FWRAT | W_DELET | \
+        W_RDCON | W_WRDAC | W_WROWN | W_SYNCH
+    W_DIREX = W_FTRAV | W_RDCON | W_SYNCH
+
+    W_FILRD = W_FGNRD
+    W_FILWR = W_FDLCH | W_DELET | W_WRDAC | W_WROWN | W_FGNWR
+    W_FILEX = W_FGNEX
+
+    WIN_RWX_PERMS = [
+        [W_FILRD, W_FILWR, W_FILEX],
+        [W_DIRRD, W_DIRWR, W_DIREX]
+    ]
+
+    WIN_FILE_PERMISSIONS = (
+        "DELETE", "READ_CONTROL", "WRITE_DAC", "WRITE_OWNER",
+        "SYNCHRONIZE", "FILE_GENERIC_READ", "FILE_GENERIC_WRITE",
+        "FILE_GENERIC_EXECUTE", "FILE_DELETE_CHILD")
+
+    WIN_DIR_PERMISSIONS = (
+        "DELETE", "READ_CONTROL", "WRITE_DAC", "WRITE_OWNER",
+        "SYNCHRONIZE", "FILE_ADD_SUBDIRECTORY", "FILE_ADD_FILE",
+        "FILE_DELETE_CHILD", "FILE_LIST_DIRECTORY", "FILE_TRAVERSE",
+        "FILE_READ_ATTRIBUTES", "FILE_WRITE_ATTRIBUTES", "FILE_READ_EA",
+        "FILE_WRITE_EA")
+
+    WIN_DIR_INHERIT_PERMISSIONS = (
+        "DELETE", "READ_CONTROL", "WRITE_DAC", "WRITE_OWNER",
+        "SYNCHRONIZE", "GENERIC_READ", "GENERIC_WRITE", "GENERIC_EXECUTE",
+        "GENERIC_ALL")
+
+    WIN_ACE_TYPES = (
+        "ACCESS_ALLOWED_ACE_TYPE", "ACCESS_DENIED_ACE_TYPE",
+        "SYSTEM_AUDIT_ACE_TYPE", "SYSTEM_ALARM_ACE_TYPE")
+
+    WIN_INHERITANCE_TYPES = (
+        "OBJECT_INHERIT_ACE", "CONTAINER_INHERIT_ACE",
+        "NO_PROPAGATE_INHERIT_ACE", "INHERIT_ONLY_ACE",
+        "INHERITED_ACE", "SUCCESSFUL_ACCESS_ACE_FLAG",
+        "FAILED_ACCESS_ACE_FLAG")
+
+    SECURITY_NT_AUTHORITY = ('SYSTEM', 'NT AUTHORITY', 5)
+
+SID_CACHE_SIZE = 1024
+
+_SID_CACHE = LookupCache(SID_CACHE_SIZE)
+
+
+def _get_object_type(path):
+    """Get whether object is file or directory."""
+    return FILE if os.path.isfile(path) else DIRECTORY
+
+
+def get_sid_cache_stats():
+    """Get hit and miss counters of the Windows SID lookup cache."""
+    return _SID_CACHE.stats()
+
+
+def clear_sid_cache():
+    """Empty the Windows SID lookup cache."""
+    _SID_CACHE.clear()
+
+
+def win_lookup_account_sid(sid):
+    """Get the (name, domain, type) account of a SID, using the cache.
+
+    Account lookups can require a round trip to a domain controller so
+    results are cached by the string form of the SID. Failed lookups (e.g.,
+    orphaned SIDs) raise and are not cached."""
+    return _SID_CACHE.get(
+        ('account', str(sid)),
+        lambda: win32security.LookupAccountSid(None, sid))
+
+
+def win_get_well_known_sid(string_sid):
+    """Get the SID object for a string SID (eg, "S-1-5-32-545"), cached."""
+    return _SID_CACHE.get(
+        ('sid', string_sid),
+        lambda: win32security.ConvertStringSidToSid(string_sid))
+
+
+def win_get_owner_sid(path):
+    """Get the file owner."""
+    sec_descriptor = win32security.GetNamedSecurityInfo(
+        path, win32security.SE_FILE_OBJECT,
+        win32security.OWNER_SECURITY_INFORMATION)
+    return sec_descriptor.GetSecurityDescriptorOwner()
+
+
+def win_get_group_sid(path):
+    """Get the file group."""
+    sec_descriptor = win32security.GetNamedSecurityInfo(
+        path, win32security.SE_FILE_OBJECT,
+        win32security.GROUP_SECURITY_INFORMATION)
+    return sec_descriptor.GetSecurityDescriptorGroup()
+
+
+def win_get_other_sid():
+    """Get the other SID.
+
+    For now this is the Users builtin account. In the future, probably should
+    allow account to be passed in and find any non-owner, non-group account
+    currently associated with the file. As a default, it could use Users."""
+    return win_get_well_known_sid("S-1-5-32-545")
+
+
+def convert_win_to_stat(win_perm, user_type, object_type):
+    """Given Win perm and user type, give stat mode."""
+    mode = 0
+
+    for oper in OPER_TYPES:
+        if win_perm & WIN_RWX_PERMS[object_type][oper] == \
+                WIN_RWX_PERMS[object_type][oper]:
+            mode = mode | STAT_MODES[user_type][oper]
+
+    return mode
+
+
+def convert_stat_to_win(mode, user_type, object_type):
+    """Given stat mode, return Win bitwise permissions for user type."""
+    win_perm = 0
+
+    for oper in OPER_TYPES:
+        if mode & STAT_MODES[user_type][oper] == STAT_MODES[user_type][oper]:
+            win_perm = win_perm | WIN_RWX_PERMS[object_type][oper]
+
+    return win_perm
+
+
+def win_get_user_type(sid, sids):
+    """Given object and SIDs, return user type."""
+    if sid == sids[OWNER]:
+        return OWNER
+
+    if sid == sids[GROUP]:
+        return GROUP
+
+    return OTHER
+
+
+def win_get_object_sids(path):
+    """Get the owner, group, other SIDs for an object."""
+    sec_descriptor = win32security.GetNamedSecurityInfo(
+        path, win32security.SE_FILE_OBJECT,
+        win32security.OWNER_SECURITY_INFORMATION |
+        win32security.GROUP_SECURITY_INFORMATION)
+    return _win_get_descriptor_sids(sec_descriptor)
+
+
+def _win_get_descriptor_sids(sec_descriptor):
+    """Get the owner, group, other SIDs from a security descriptor."""
+    return [
+        sec_descriptor.GetSecurityDescriptorOwner(),
+        sec_descriptor.GetSecurityDescriptorGroup(),
+        win_get_other_sid()
+    ]
+
+
+def _win_get_named_security(path):
+    """Get a security descriptor with owner, group and DACL in one call."""
+    return win32security.GetNamedSecurityInfo(
+        path, win32security.SE_FILE_OBJECT,
+        win32security.OWNER_SECURITY_INFORMATION |
+        win32security.GROUP_SECURITY_INFORMATION |
+        win32security.DACL_SECURITY_INFORMATION)
+
+
+def win_get_permissions(path):
+    """Get the file or dir permissions."""
+    if not os.path.exists(path):
+        raise FileNotFoundError('Path %s could not be found.' % path)
+
+    return _win_get_permissions(path, _get_object_type(path))
+
+
+def _win_get_permissions(path, object_type):
+    """Get the permissions."""
+    sec_des = _win_get_named_security(path)
+    dacl = sec_des.GetSecurityDescriptorDacl()
+
+    sids = _win_get_descriptor_sids(sec_des)
+    mode = 0
+
+    for index in range(0, dacl.GetAceCount()):
+        ace = dacl.GetAce(index)
+        if ace[0][0] == win32security.ACCESS_ALLOWED_ACE_TYPE and \
+                win_lookup_account_sid(ace[2]) != SECURITY_NT_AUTHORITY:
+            # Not handling win32security.ACCESS_DENIED_ACE_TYPE
+            mode = mode | convert_win_to_stat(
+                ace[1],
+                win_get_user_type(ace[2], sids),
+                object_type)
+
+    return mode
+
+
+def win_set_permissions(path, mode, templates=None):
+    """Set the file or dir permissions."""
+    if not os.path.exists(path):
+        raise FileNotFoundError('Path %s could not be found.' % path)
+
+    _win_set_permissions(path, mode, _get_object_type(path), templates)
+
+
+def _win_set_permissions(path, mode, object_type, templates=None):
+    """Set the permissions.
+
+    If templates (a dict) is given, security descriptors built for one
+    object are reused for later objects with the same object type, mode,
+    owner, group and SYSTEM ACE instead of rebuilding the DACL."""
+    # Overview of Windows inheritance:
+    # Get/SetNamedSecurityInfo  = Always includes inheritance
+    # Get/SetFileSecurity       = Can exclude/disable inheritance
+    # Here we read effective permissions with GetNamedSecurityInfo, i.e.,
+    # including inherited permissions. However, we'll set permissions with
+    # SetFileSecurity and NO_INHERITANCE, to disable inheritance.
+    sec_des = _win_get_named_security(path)
+    dacl = sec_des.GetSecurityDescriptorDacl()
+
+    system_ace = None
+    for index in range(0, dacl.GetAceCount()):
+        ace = dacl.GetAce(index)
+        try:
+            if ace[2] and ace[2].IsValid() and win_lookup_account_sid(
+                    ace[2]) == SECURITY_NT_AUTHORITY:
+                system_ace = ace
+        except pywinerror:
+            print("Found orphaned SID:", ace[2])
+
+    sids = _win_get_descriptor_sids(sec_des)
+
+    if templates is None:
+        new_des = _win_build_security_descriptor(
+            mode, object_type, sids, system_ace)
+    else:
+        key = (object_type, mode, str(sids[OWNER]), str(sids[GROUP]),
+               system_ace and (system_ace[1], str(system_ace[2])))
+        new_des = templates.get(key)
+        if new_des is None:
+            new_des = _win_build_security_descriptor(
+                mode, object_type, sids, system_ace)
+            templates[key] = new_des
+
+    win32security.SetFileSecurity(
+        path, win32security.DACL_SECURITY_INFORMATION, new_des)
+
+
+def _win_build_security_descriptor(mode, object_type, sids, system_ace):
+    """Build a descriptor with a new DACL giving SIDs the mode."""
+    dacl = win32security.ACL()
+
+    if system_ace:
+        dacl.AddAccessAllowedAceEx(
+            win32security.ACL_REVISION,
+            win32security.NO_INHERITANCE, system_ace[1], system_ace[2])
+
+    for user_type, sid in enumerate(sids):
+        win_perm = convert_stat_to_win(mode, user_type, object_type)
+
+        if win_perm > 0:
+            dacl.AddAccessAllowedAceEx(
+                win32security.ACL_REVISION,
+                win32security.NO_INHERITANCE, win_perm, sid)
+
+    sec_des = win32security.SECURITY_DESCRIPTOR()
+    sec_des.SetSecurityDescriptorDacl(1, dacl, 0)
+    return sec_des
+
+
+def print_win_inheritance(flags):
+    """Display inheritance flags."""
+    print("  -Flags:", hex(flags))
+    if flags == win32security.NO_INHERITANCE:
+        print("    ", "NO_INHERITANCE")
+    else:
+        for i in WIN_INHERITANCE_TYPES:
+            if flags & getattr(win32security, i) == getattr(win32security, i):
+                print("    ", i)
+
+
+def print_win_ace_type(ace_type):
+    """Print ACE type."""
+    print("  -Type:")
+    for i in WIN_ACE_TYPES:
+        if getattr(ntsecuritycon, i) == ace_type:
+            print("    ", i)
+
+
+def print_win_permissions(win_perm, flags, object_type):
+    """Print permissions from ACE information."""
+    print("  -Permissions Mask:", hex(win_perm), "(" + str(win_perm) + ")")
+
+    # files and directories do permissions differently
+    if object_type == FILE:
+        permissions = WIN_FILE_PERMISSIONS
+    else:
+        permissions = WIN_DIR_PERMISSIONS
+        # directories have ACE that is inherited by children within them
+        if flags & ntsecuritycon.OBJECT_INHERIT_ACE == \
+                ntsecuritycon.OBJECT_INHERIT_ACE and flags & \
+                ntsecuritycon.INHERIT_ONLY_ACE == \
+                ntsecuritycon.INHERIT_ONLY_ACE:
+            permissions = WIN_DIR_INHERIT_PERMISSIONS
+
+    calc_mask = 0  # see if we are printing all of the permissions
+    for i in permissions:
+        if getattr(ntsecuritycon, i) & win_perm == getattr(
+                ntsecuritycon, i):
+            calc_mask = calc_mask | getattr(ntsecuritycon, i)
+            print("    ", i)
+    print("  -Mask calculated from printed permissions:", hex(calc_mask))
+
+
+def _print_win_obj_info(path):
+    """Print windows object security info."""
+    # get ACEs
+    sec_descriptor = win32security.GetFileSecurity(
+        path, win32security.DACL_SECURITY_INFORMATION)
+    dacl = sec_descriptor.GetSecurityDescriptorDacl()
+    if dacl is None:
+        print("No Discretionary ACL")
+        return
+
+    for ace_no in range(0, dacl.GetAceCount()):
+        ace = dacl.GetAce(ace_no)
+        print("ACE", ace_no)
+
+        print('  -SID:', win_lookup_account_sid(ace[2]))
+
+        print_win_ace_type(ace[0][0])
+        print_win_inheritance(ace[0][1])
+        print_win_permissions(ace[1], ace[0][1], _get_object_type(path))
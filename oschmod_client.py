@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""oschmod client module.
+
+Send requests to an ``oschmod serve`` daemon (see ``oschmod.daemon``).
+
+This module is kept outside the ``oschmod`` package, and imports nothing
+from it, so that the ``oschmod`` command can hand a plain command to a
+running daemon without importing the package at all. Commands the
+daemon does not handle, or that find no daemon, run through
+``oschmod.cli``. Looking for a daemon only costs a stat of its socket:
+the modules needed to talk to one are imported once one is found.
+
+Only a daemon that is plainly the user's own is used: the socket must be
+owned by the user and, where the platform can tell, so must the process
+serving it. Otherwise no client is returned and callers do the work
+themselves.
+"""
+
+import errno
+import importlib
+import os
+import stat
+import sys
+
+SOCKET_ENV = 'OSCHMOD_SOCKET'
+TMP_DIR = '/tmp'
+
+# first arguments naming subcommands, which never go to the daemon
+SUBCOMMANDS = ('serve', 'tar', 'watch')
+
+
+def socket_path():
+    """Get path of the daemon's socket.
+
+    The OSCHMOD_SOCKET environment variable is used if set. Otherwise, the
+    socket is kept in XDG_RUNTIME_DIR or, failing that, in a directory in
+    /tmp named for the user and only accessible to them."""
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'oschmod.sock')
+    return os.path.join(private_tmp_dir(), 'oschmod.sock')
+
+
+def private_tmp_dir():
+    """Get path of the user's directory in /tmp for the daemon's socket."""
+    return os.path.join(TMP_DIR, 'oschmod-%d' % os.getuid())
+
+
+class Client:
+    r"""
+    Connection to an oschmod daemon.
+
+    Methods mirror the daemon's operations. Errors are raised as
+    ``OSError`` when the daemon reports an error number, otherwise as
+    ``ValueError``. Relative paths are made absolute before sending as the
+    daemon runs in a different working directory.
+
+    Args:
+    sock: (:obj:`socket.socket`)
+        Socket connected to the daemon.
+
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._file = sock.makefile('rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close connection."""
+        self._file.close()
+        self._sock.close()
+
+    def call(self, operation, **arguments):
+        """Run operation in the daemon and get its result."""
+        # pylint: disable=import-outside-toplevel
+        import json
+
+        request = dict(arguments, op=operation)
+        if request.get('path') is not None:
+            request['path'] = os.path.abspath(request['path'])
+        self._sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        line = self._file.readline()
+        if not line:
+            raise OSError(errno.ECONNRESET, 'daemon closed connection')
+
+        response = json.loads(line.decode('utf-8'))
+        if response['ok']:
+            return response.get('result')
+        if response.get('errno') is not None:
+            raise OSError(response['errno'], response['error'],
+                          response.get('filename'))
+        raise ValueError(response['error'])
+
+    def set_mode(self, path, mode):
+        """Set mode of object."""
+        return self.call('set_mode', path=path, mode=mode)
+
+    def set_mode_recursive(self, path, mode, dir_mode=None, workers=1):
+        """Set modes of objects at or under path and get counters."""
+        return self.call('set_mode_recursive', path=path, mode=mode,
+                         dir_mode=dir_mode, workers=workers)
+
+    def get_mode(self, path):
+        """Get mode of object."""
+        return self.call('get_mode', path=path)
+
+    def scan(self, path):
+        """Count objects at or under path by type and octal mode."""
+        return self.call('scan', path=path)
+
+
+def connect(path=None):
+    """Get client connected to the daemon, or None if none is running.
+
+    None is also returned if the socket, or the process serving it, does
+    not belong to the user."""
+    if not hasattr(os, 'getuid'):
+        return None
+    path = path or socket_path()
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        return None
+
+    # pylint: disable=import-outside-toplevel
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if not _is_own_peer(sock):
+            sock.close()
+            return None
+    except OSError:
+        sock.close()
+        return None
+    return Client(sock)
+
+
+def _is_own_peer(sock):
+    """Get whether the process at the other end of sock runs as the user.
+
+    Where the platform cannot tell (no SO_PEERCRED), the ownership of the
+    socket has to do."""
+    # pylint: disable=import-outside-toplevel
+    import socket
+    import struct
+
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+    credentials = struct.Struct('3i')
+    _, uid, _ = credentials.unpack(sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, credentials.size))
+    return uid == os.getuid()
+
+
+def send(recursive, path, mode, workers=1):
+    """Set mode (recursively) in the daemon, if running.
+
+    Returns whether a daemon did it."""
+    client = connect()
+    if client is None:
+        return False
+
+    with client:
+        if recursive:
+            client.set_mode_recursive(path, mode, workers=workers)
+        else:
+            client.set_mode(path, mode)
+    return True
+
+
+def send_plain(argv):
+    """Send a plain "[-R] mode object" command to a daemon, if running.
+
+    Returns whether the command was sent. Anything with options, or with a
+    subcommand, is left for the full command line parser."""
+    recursive = argv[:1] == ['-R']
+    if recursive:
+        argv = argv[1:]
+    if len(argv) != 2 or argv[0] in SUBCOMMANDS or \
+            any(arg.startswith('-') for arg in argv):
+        return False
+    return send(recursive, argv[1], argv[0])
+
+
+def main():
+    """Provide main function for the oschmod command."""
+    if send_plain(sys.argv[1:]):
+        return
+
+    # the package is only loaded for commands the daemon did not take
+    importlib.import_module('oschmod.cli').main()
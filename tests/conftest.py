@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures for oschmod tests."""
+import collections
+import os
+
+import pytest
+
+import oschmod
+
+SYSTEM_SID = "S-1-5-18"
+USERS_SID = "S-1-5-32-545"
+OWNER_SID = "S-1-5-21-1000"
+GROUP_SID = "S-1-5-21-513"
+
+ACCOUNTS = {
+    SYSTEM_SID: ('SYSTEM', 'NT AUTHORITY', 5),
+    USERS_SID: ('Users', 'BUILTIN', 4),
+    OWNER_SID: ('alice', 'DOMAIN', 1),
+    GROUP_SID: ('Domain Users', 'DOMAIN', 2),
+}
+
+# stand-ins for the ntsecuritycon read, write, execute masks
+FAKE_RWX_PERMS = [
+    [0x1, 0x2, 0x4],
+    [0x10, 0x20, 0x40]
+]
+
+
+class FakeSID:
+    """Stand-in for PySID."""
+
+    def __init__(self, string_sid):
+        self.string_sid = string_sid
+
+    def __eq__(self, other):
+        return isinstance(other, FakeSID) and \
+            other.string_sid == self.string_sid
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.string_sid)
+
+    def __str__(self):
+        return "PySID:" + self.string_sid
+
+    def IsValid(self):  # noqa: N802 pylint: disable=invalid-name
+        """Mimic PySID.IsValid."""
+        return True
+
+
+class FakeACL:
+    """Stand-in for PyACL."""
+
+    def __init__(self, aces=None):
+        self.aces = list(aces or [])
+
+    def GetAceCount(self):  # noqa: N802 pylint: disable=invalid-name
+        """Mimic PyACL.GetAceCount."""
+        return len(self.aces)
+
+    def GetAce(self, index):  # noqa: N802 pylint: disable=invalid-name
+        """Mimic PyACL.GetAce."""
+        return self.aces[index]
+
+    def AddAccessAllowedAceEx(  # noqa: N802 pylint: disable=invalid-name
+            self, revision, flags, mask, sid):
+        """Mimic PyACL.AddAccessAllowedAceEx."""
+        assert revision == FakeWin32Security.ACL_REVISION
+        self.aces.append(
+            ((FakeWin32Security.ACCESS_ALLOWED_ACE_TYPE, flags), mask, sid))
+
+
+class FakeSecurityDescriptor:
+    """Stand-in for PySECURITY_DESCRIPTOR."""
+
+    def __init__(self, owner=None, group=None, dacl=None):
+        self.owner = owner
+        self.group = group
+        self.dacl = dacl
+
+    # pylint: disable=invalid-name
+    def GetSecurityDescriptorOwner(self):  # noqa: N802
+        """Mimic PySECURITY_DESCRIPTOR.GetSecurityDescriptorOwner."""
+        return self.owner
+
+    def GetSecurityDescriptorGroup(self):  # noqa: N802
+        """Mimic PySECURITY_DESCRIPTOR.GetSecurityDescriptorGroup."""
+        return self.group
+
+    def GetSecurityDescriptorDacl(self):  # noqa: N802
+        """Mimic PySECURITY_DESCRIPTOR.GetSecurityDescriptorDacl."""
+        return self.dacl
+
+    def SetSecurityDescriptorDacl(  # noqa: N802
+            self, present, dacl, defaulted):
+        """Mimic PySECURITY_DESCRIPTOR.SetSecurityDescriptorDacl."""
+        assert present and not defaulted
+        self.dacl = dacl
+
+
+class FakeWin32Security:
+    """Stand-in for the win32security module that counts API calls.
+
+    Security information is kept per path in ``objects`` as
+    (owner SID, group SID, list of ACEs)."""
+
+    # pylint: disable=invalid-name
+    SE_FILE_OBJECT = 1
+    OWNER_SECURITY_INFORMATION = 0x1
+    GROUP_SECURITY_INFORMATION = 0x2
+    DACL_SECURITY_INFORMATION = 0x4
+    ACCESS_ALLOWED_ACE_TYPE = 0
+    NO_INHERITANCE = 0
+    ACL_REVISION = 2
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.path_calls = collections.defaultdict(collections.Counter)
+        self.objects = {}
+
+    def _count(self, name, path=None):
+        self.calls[name] += 1
+        if path is not None:
+            self.path_calls[path][name] += 1
+
+    def _object(self, path):
+        if path not in self.objects:
+            self.objects[path] = (
+                FakeSID(OWNER_SID), FakeSID(GROUP_SID), [
+                    ((self.ACCESS_ALLOWED_ACE_TYPE, 0), 0x77,
+                     FakeSID(SYSTEM_SID)),
+                    ((self.ACCESS_ALLOWED_ACE_TYPE, 0), 0x77,
+                     FakeSID(OWNER_SID))])
+        return self.objects[path]
+
+    def GetNamedSecurityInfo(  # noqa: N802
+            self, path, object_type, info):
+        """Mimic win32security.GetNamedSecurityInfo."""
+        assert object_type == self.SE_FILE_OBJECT
+        self._count('GetNamedSecurityInfo', path)
+        owner, group, aces = self._object(path)
+        sec_des = FakeSecurityDescriptor()
+        if info & self.OWNER_SECURITY_INFORMATION:
+            sec_des.owner = owner
+        if info & self.GROUP_SECURITY_INFORMATION:
+            sec_des.group = group
+        if info & self.DACL_SECURITY_INFORMATION:
+            sec_des.dacl = FakeACL(aces)
+        return sec_des
+
+    def SetFileSecurity(self, path, info, sec_des):  # noqa: N802
+        """Mimic win32security.SetFileSecurity."""
+        assert info == self.DACL_SECURITY_INFORMATION
+        self._count('SetFileSecurity', path)
+        owner, group, _ = self._object(path)
+        self.objects[path] = (
+            owner, group, list(sec_des.GetSecurityDescriptorDacl().aces))
+
+    def LookupAccountSid(self, system, sid):  # noqa: N802
+        """Mimic win32security.LookupAccountSid."""
+        assert system is None
+        self._count('LookupAccountSid')
+        return ACCOUNTS[sid.string_sid]
+
+    def ConvertStringSidToSid(self, string_sid):  # noqa: N802
+        """Mimic win32security.ConvertStringSidToSid."""
+        self._count('ConvertStringSidToSid')
+        return FakeSID(string_sid)
+
+    def ACL(self):  # noqa: N802
+        """Mimic win32security.ACL."""
+        self._count('ACL')
+        return FakeACL()
+
+    def SECURITY_DESCRIPTOR(self):  # noqa: N802
+        """Mimic win32security.SECURITY_DESCRIPTOR."""
+        self._count('SECURITY_DESCRIPTOR')
+        return FakeSecurityDescriptor()
+
+
+@pytest.fixture
+def fake_win32(monkeypatch):
+    """Route oschmod's Windows code through a fake win32security."""
+    fake = FakeWin32Security()
+    windows = oschmod.windows
+    monkeypatch.setattr(windows, 'win32security', fake, raising=False)
+    monkeypatch.setattr(windows, 'pywinerror', KeyError, raising=False)
+    monkeypatch.setattr(windows, 'WIN_RWX_PERMS', FAKE_RWX_PERMS,
+                        raising=False)
+    monkeypatch.setattr(windows, 'SECURITY_NT_AUTHORITY',
+                        ACCOUNTS[SYSTEM_SID], raising=False)
+    oschmod.clear_sid_cache()
+    yield fake
+    oschmod.clear_sid_cache()
+
+
+@pytest.fixture
+def memory_backend():
+    """Dispatch oschmod's public functions through an in-memory tree."""
+    backend = oschmod.MemoryBackend()
+    with oschmod.use_backend(backend):
+        yield backend
+
+
+@pytest.fixture
+def create_file():
+    """Get function creating a file with a mode."""
+    def create(path, mode=0o666):
+        with open(path, 'w+') as fileh:
+            fileh.write("contents")
+        os.chmod(path, mode)
+    return create
+
+
+@pytest.fixture
+def child_env():
+    """Get environment for child interpreters importing this oschmod."""
+    return dict(os.environ, PYTHONPATH=os.path.dirname(
+        os.path.dirname(os.path.abspath(oschmod.__file__))))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""test_acl module."""
+import errno
+import os
+import struct
+
+import pytest
+
+import oschmod
+
+acl = pytest.importorskip("oschmod.acl")
+
+
+def _decode(value):
+    """Get (tag, perm, id) entries of an ACL extended attribute."""
+    assert struct.unpack_from('<I', value) == (acl.ACL_EA_VERSION,)
+    return [struct.unpack_from('<HHI', value, offset)
+            for offset in range(4, len(value), 8)]
+
+
+def test_encode_acl():
+    """Check ACLs are encoded as setfacl would."""
+    access, default = acl.parse_acl(
+        "u:1000:rwX, g::r-x, g:2000:6, d:u::rwx, d:g::5, d:o:---")
+    assert default == (
+        (acl.ACL_USER_OBJ, acl.ACL_UNDEFINED_ID, 7, False),
+        (acl.ACL_GROUP_OBJ, acl.ACL_UNDEFINED_ID, 5, False),
+        (acl.ACL_OTHER, acl.ACL_UNDEFINED_ID, 0, False))
+
+    undefined = acl.ACL_UNDEFINED_ID
+    # missing entries come from mode, mask from the group class
+    assert _decode(acl.encode_acl(access, 0o640, oschmod.FILE)) == [
+        (acl.ACL_USER_OBJ, 6, undefined),
+        (acl.ACL_USER, 6, 1000),
+        (acl.ACL_GROUP_OBJ, 5, undefined),
+        (acl.ACL_GROUP, 6, 2000),
+        (acl.ACL_MASK, 7, undefined),
+        (acl.ACL_OTHER, 0, undefined)]
+    assert _decode(acl.encode_acl(access, 0o640, oschmod.DIRECTORY))[1] == \
+        (acl.ACL_USER, 7, 1000)
+
+    for spec in ("u::rwz", "m:1000:rwx", "g::", "x::rwx", "u:nosuchuser:r"):
+        with pytest.raises(ValueError):
+            acl.parse_acl(spec)
+
+
+def test_acl_recursive_memory(memory_backend):
+    """Check ACLs are encoded once per distinct ACL in a recursive run."""
+    count = memory_backend.populate('top', 2, 3, 20)
+    spec = "g:2000:rwX,d:g:2000:rwX"
+    oschmod.set_mode_recursive('top', 'u=rw,go=r', 'u=rwx,go=rx', acl=spec)
+
+    # an access ACL for every object, a default ACL for 13 directories
+    assert memory_backend.ops['setxattr'] == count + 13
+    file_value = memory_backend.get_xattr('top/dir1/file1', acl.ACCESS_XATTR)
+    assert (acl.ACL_GROUP, 6, 2000) in _decode(file_value)
+    assert memory_backend.get_xattr(
+        'top/dir1', acl.DEFAULT_XATTR) == memory_backend.get_xattr(
+            'top', acl.DEFAULT_XATTR)
+    with pytest.raises(OSError):
+        memory_backend.get_xattr('top/dir1/file1', acl.DEFAULT_XATTR)
+
+    # each object's ACL is the same bytes object built once
+    assert file_value is memory_backend.get_xattr(
+        'top/dir2/file9', acl.ACCESS_XATTR)
+
+
+def test_acl_recursive(tmp_path):
+    """Check ACLs are set on the filesystem, where supported."""
+    topdir = str(tmp_path / 'topdir')
+    os.makedirs(os.path.join(topdir, 'testdir'))
+    testfile = os.path.join(topdir, 'testdir', 'file1')
+    with open(testfile, 'w+') as fileh:
+        fileh.write("contents")
+
+    try:
+        oschmod.set_mode_recursive(
+            topdir, 'u=rw,go=', 'u=rwx,go=', acl="g:%d:rX" % os.getgid())
+    except OSError as err:
+        if err.errno in (errno.ENOTSUP, errno.EOPNOTSUPP):
+            pytest.skip("POSIX ACLs not supported")
+        raise
+
+    assert (acl.ACL_GROUP, 4, os.getgid()) in _decode(
+        os.getxattr(testfile, acl.ACCESS_XATTR))
+    # mode's group bits become the ACL mask
+    assert oschmod.get_mode(testfile) == 0o640
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""test_archive module."""
+import io
+import sys
+import tarfile
+import tracemalloc
+
+from oschmod import archive, cli
+
+
+class _Pipe:
+    """Non-seekable, read-only stream, like a pipe."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, data):
+        self._file = io.BytesIO(data)
+
+    def read(self, size=-1):
+        """Read up to size bytes."""
+        return self._file.read(size)
+
+
+class _Zeros:
+    """Stream of size zero bytes, generated as read."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def read(self, size=-1):
+        """Read up to size bytes."""
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        self.remaining -= size
+        return b'\0' * size
+
+
+def _member(name, member_type=tarfile.REGTYPE, mode=0o664, data=b''):
+    """Get TarInfo and file object for a member."""
+    info = tarfile.TarInfo(name)
+    info.type = member_type
+    info.mode = mode
+    info.size = len(data)
+    if member_type == tarfile.SYMTYPE:
+        info.linkname = 'file1'
+    return info, io.BytesIO(data) if data else None
+
+
+def _archive(compression=''):
+    """Get bytes of a small archive."""
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode='w|' + compression) as tar:
+        tar.addfile(*_member('top', tarfile.DIRTYPE, 0o777))
+        tar.addfile(*_member('top/file1', mode=0o666, data=b'contents'))
+        tar.addfile(*_member('top/script', mode=0o775, data=b'#!/bin/sh'))
+        tar.addfile(*_member('top/link', tarfile.SYMTYPE, 0o777))
+    return data.getvalue()
+
+
+def _modes(data):
+    """Get {name: (mode, contents)} of members of archive bytes."""
+    modes = {}
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as tar:
+        for info in tar:
+            contents = None
+            if info.isreg():
+                contents = tar.extractfile(info).read()
+            modes[info.name] = (info.mode, contents)
+    return modes
+
+
+def test_set_mode_tar():
+    """Check modes of members are set as they would be on disk."""
+    dst = io.BytesIO()
+    stats = archive.set_mode_tar(
+        _Pipe(_archive('gz')), dst, 'go-w,a+X', 'u=rwx,go=rx')
+
+    assert _modes(dst.getvalue()) == {
+        'top': (0o755, None),
+        'top/file1': (0o644, b'contents'),
+        'top/script': (0o755, b'#!/bin/sh'),
+        'top/link': (0o777, None)}
+    assert stats.as_dict()['changed'] == 3
+    assert stats.as_dict()['unchanged'] == 1
+
+
+def test_set_mode_tar_files(tmp_path, monkeypatch):
+    """Check archives can be given by name, with compression by suffix."""
+    src = str(tmp_path / 'release.tar')
+    dst = str(tmp_path / 'release.tar.xz')
+    with open(src, 'wb') as src_file:
+        src_file.write(_archive())
+
+    archive.set_mode_tar(src, dst, 0o600, 0o700)
+    with open(dst, 'rb') as dst_file:
+        data = dst_file.read()
+    assert data.startswith(b'\xfd7zXZ')
+    assert _modes(data)['top/file1'] == (0o600, b'contents')
+
+    cli_dst = str(tmp_path / 'cli.tar')
+    monkeypatch.setattr(sys, 'argv', [
+        'oschmod', 'tar', '--dir-mode', '750', 'u=rw,g=r,o=', src, cli_dst])
+    cli.main()
+    with open(cli_dst, 'rb') as dst_file:
+        modes = _modes(dst_file.read())
+    assert modes['top'][0] == 0o750
+    assert modes['top/script'][0] == 0o640
+
+
+def test_set_mode_tar_streamed():
+    """Check large members are streamed rather than held in memory."""
+    size = 32 * 1024 * 1024
+    src = io.BytesIO()
+    with tarfile.open(fileobj=src, mode='w|') as tar:
+        info = tarfile.TarInfo('big')
+        info.size = size
+        tar.addfile(info, _Zeros(size))
+
+    class _Sink:
+        """Write-only stream counting bytes written."""
+
+        # pylint: disable=too-few-public-methods
+
+        written = 0
+
+        def write(self, data):
+            """Count bytes written."""
+            self.written += len(data)
+
+    sink = _Sink()
+    pipe = _Pipe(src.getvalue())
+    tracemalloc.start()
+    stats = archive.set_mode_tar(pipe, sink, 'go=')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert stats.changed == 1
+    assert sink.written >= size
+    assert peak < 4 * 1024 * 1024
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""test_cli module."""
+import os
+
+from oschmod import cli
+
+
+def test_cli_stats(monkeypatch, capsys, tmp_path, create_file):
+    """Check the CLI only prints counters kept by the recursive run."""
+    src = str(tmp_path / 'src')
+    dst = str(tmp_path / 'dst')
+    for top in (src, dst):
+        os.makedirs(top)
+        create_file(os.path.join(top, 'file1'))
+
+    monkeypatch.setattr('sys.argv', [
+        'oschmod', '-R', '--stats', '750', src])
+    cli.main()
+    assert capsys.readouterr().err.splitlines()[-1] == \
+        'visited: 2, deduplicated: 0'
+
+    monkeypatch.setattr('sys.argv', [
+        'oschmod', '-R', '--stats', '--reference', src, dst])
+    cli.main()
+    assert capsys.readouterr().err.splitlines()[-1] == \
+        'visited: 2, changed: 2, unchanged: 0, missing: 0, errors: 0'
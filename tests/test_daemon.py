@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""test_daemon module."""
+# pylint: disable=redefined-outer-name
+import errno
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import oschmod
+import oschmod_client
+from oschmod import cli, daemon
+
+pytestmark = pytest.mark.skipif(
+    not daemon.HAS_UNIX_SOCKETS, reason="Unix domain sockets not available")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """Run a daemon on a socket in a temporary directory."""
+    path = str(tmp_path / 'oschmod.sock')
+    monkeypatch.setenv(oschmod_client.SOCKET_ENV, path)
+    server = daemon.Server()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    assert not os.path.exists(path)
+
+
+def test_daemon_operations(server, tmp_path, create_file):
+    """Check operations run in the daemon."""
+    topdir = str(tmp_path / 'topdir')
+    os.makedirs(os.path.join(topdir, 'testdir'))
+    create_file(os.path.join(topdir, 'file1'))
+    create_file(os.path.join(topdir, 'testdir', 'file2'))
+    assert oct(os.stat(server.path).st_mode & 0o777) == oct(0o700)
+
+    with daemon.connect() as client:
+        client.set_mode(os.path.join(topdir, 'file1'), "u+x")
+        assert client.get_mode(os.path.join(topdir, 'file1')) == 0o766
+
+        counts = client.set_mode_recursive(topdir, "go-w", "u=rwx,go=rx")
+        assert counts['visited'] == 4
+        assert client.scan(topdir) == {
+            'file': {'744': 1, '644': 1}, 'directory': {'755': 2}}
+
+        with pytest.raises(OSError) as err:
+            client.get_mode(os.path.join(topdir, 'missing'))
+        assert err.value.errno == errno.ENOENT
+        with pytest.raises(ValueError):
+            client.call('remove', path=topdir)
+
+    assert server.requests == 6
+    assert oschmod.get_cache_stats()['mode']['hits'] > 0
+
+
+def test_daemon_cli(server, tmp_path, monkeypatch, create_file):
+    """Check the CLI sends requests to a running daemon."""
+    testfile = str(tmp_path / 'file1')
+    create_file(testfile)
+    monkeypatch.chdir(str(tmp_path))
+
+    monkeypatch.setattr(sys, 'argv', ['oschmod', 'go-w', 'file1'])
+    oschmod_client.main()
+    assert oschmod.get_mode(testfile) == 0o644
+    assert server.requests == 1
+
+    monkeypatch.setattr(sys, 'argv', ['oschmod', '-R', 'u+x', 'file1'])
+    cli.main()
+    assert oschmod.get_mode(testfile) == 0o744
+    assert server.requests == 2
+
+    monkeypatch.setattr(sys, 'argv', ['oschmod', '--no-daemon', '600',
+                                      'file1'])
+    oschmod_client.main()
+    assert oschmod.get_mode(testfile) == 0o600
+    assert server.requests == 2
+
+    with pytest.raises(OSError):
+        daemon.Server(server.path)
+
+
+def test_daemon_socket_checks(tmp_path, monkeypatch, create_file):
+    """Check only the user's own sockets are used or removed."""
+    path = str(tmp_path / 'oschmod.sock')
+    create_file(path)
+    assert daemon.connect(path) is None
+    with pytest.raises(OSError) as err:
+        daemon.Server(path)
+    assert err.value.errno == errno.EEXIST
+    assert os.path.isfile(path)
+
+    # by default, the socket is in a private directory in /tmp
+    monkeypatch.setattr(oschmod_client, 'TMP_DIR', str(tmp_path))
+    monkeypatch.delenv(oschmod_client.SOCKET_ENV, raising=False)
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    server = daemon.Server()
+    try:
+        directory = os.path.dirname(server.path)
+        assert directory == str(tmp_path / ('oschmod-%d' % os.getuid()))
+        assert oct(os.stat(directory).st_mode & 0o777) == oct(0o700)
+        own_client = daemon.connect()
+        assert own_client is not None
+        own_client.close()
+
+        uid = os.getuid()
+        monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+        assert daemon.connect(server.path) is None
+        monkeypatch.undo()
+    finally:
+        server.server_close()
+
+    os.chmod(directory, 0o755)
+    monkeypatch.setattr(oschmod_client, 'TMP_DIR', str(tmp_path))
+    with pytest.raises(OSError) as err:
+        daemon.Server(os.path.join(directory, 'oschmod.sock'))
+    assert err.value.errno == errno.EPERM
+
+
+def test_daemon_cli_start_up(server, tmp_path, child_env, create_file):
+    """Check plain commands reach the daemon without importing oschmod."""
+    testfile = str(tmp_path / 'file1')
+    create_file(testfile)
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, oschmod_client; oschmod_client.main(); '
+        'print("oschmod" in sys.modules)', 'go-w', testfile], env=child_env)
+    assert output.strip() == b'False'
+    assert oschmod.get_mode(testfile) == 0o644
+    assert server.requests == 1
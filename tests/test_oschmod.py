@@ -2,15 +2,23 @@
 # pylint: disable=redefined-outer-name
 """test_oschmod module."""
 import glob
+import io
 import os
 import random
 import shutil
+import signal
 import stat
 import string
+import subprocess
+import sys
+import threading
 import time
+import tracemalloc
 
 from random import randrange
 
+import pytest
+
 import oschmod
 
 
@@ -414,3 +422,575 @@ def test_symbolic_use():
     assert mode_dir3 == dir_mode
     assert mode_file1 == file_mode
     assert mode_file2 == file_mode
+
+
+def test_win_names_reexported():
+    """Check Windows names are still available from oschmod itself."""
+    windows = oschmod.windows
+    names = [name for name in dir(windows) if name.startswith(
+        ('W_', 'WIN_', 'win_', '_win_', 'SECURITY_'))]
+    assert '_win_set_permissions' in names
+    for name in names:
+        assert getattr(oschmod, name) is getattr(windows, name), name
+
+
+def test_win_sid_cache(fake_win32, tmp_path):
+    """Check SID lookups are cached across Windows permission calls."""
+    paths = []
+    for name in ('file1', 'file2', 'file3'):
+        path = str(tmp_path / name)
+        with open(path, 'w+') as fileh:
+            fileh.write("contents")
+        paths.append(path)
+
+    for path in paths:
+        oschmod.win_set_permissions(path, 0o640)
+        assert oschmod.win_get_permissions(path) == 0o640
+
+    # one descriptor read per get and per set, regardless of SIDs needed
+    for path in paths:
+        assert fake_win32.path_calls[path]['GetNamedSecurityInfo'] == 2
+
+    # each distinct SID (SYSTEM, owner, group) is looked up only once
+    assert fake_win32.calls['LookupAccountSid'] == 3
+    assert fake_win32.calls['ConvertStringSidToSid'] == 1
+
+    stats = oschmod.get_sid_cache_stats()
+    assert stats['misses'] == 4
+    assert stats['hits'] > 0
+    assert stats['size'] == 4
+    assert stats['maxsize'] == oschmod.SID_CACHE_SIZE
+
+
+def test_lookup_cache_bounded():
+    """Check lookup cache evicts least recently used entries."""
+    cache = oschmod.cache.LookupCache(2)
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('a', lambda: 0) == 1
+    assert cache.get('c', lambda: 3) == 3
+    assert cache.get('b', lambda: 4) == 4
+    assert cache.get('a', lambda: 0) == 0
+    assert cache.stats() == {'hits': 1, 'misses': 5, 'size': 2, 'maxsize': 2}
+
+
+def test_win_recursive_templates(fake_win32, monkeypatch, tmp_path):
+    """Check recursive Windows runs build each distinct DACL only once."""
+    monkeypatch.setattr(oschmod.backends, 'IS_WINDOWS', True)
+
+    topdir = tmp_path / 'testdir1'
+    testdir = topdir / 'testdir2' / 'testdir3'
+    os.makedirs(str(testdir))
+    files = [topdir / 'file1', topdir / 'file2', testdir / 'file3']
+    for path in files:
+        with open(str(path), 'w+') as fileh:
+            fileh.write("contents")
+
+    oschmod.set_mode_recursive(str(topdir), 0o600, 0o700)
+
+    # one DACL for files and one for directories
+    assert fake_win32.calls['ACL'] == 2
+    assert fake_win32.calls['SECURITY_DESCRIPTOR'] == 2
+
+    # each object has one read and one write, no matter how many ACEs
+    dirs = [topdir, topdir / 'testdir2', testdir]
+    for path in files + dirs:
+        counts = fake_win32.path_calls[str(path)]
+        assert counts['GetNamedSecurityInfo'] == 1
+        assert counts['SetFileSecurity'] == 1
+
+    for path in files:
+        assert oschmod.win_get_permissions(str(path)) == 0o600
+    for path in dirs:
+        assert oschmod.win_get_permissions(str(path)) == 0o700
+
+    # SYSTEM ACE is kept
+    _, _, aces = fake_win32.objects[str(files[0])]
+    assert str(aces[0][2]) == "PySID:S-1-5-18"
+
+
+def test_memory_backend(memory_backend):
+    """Check public functions dispatch through the in-memory backend."""
+    memory_backend.add_file('topdir/file1', 0o644)
+    assert oschmod.get_backend() is memory_backend
+    assert oschmod.get_object_type('topdir') == oschmod.DIRECTORY
+    assert oschmod.get_object_type('topdir/file1') == oschmod.FILE
+    assert oschmod.get_mode('topdir') == 0o755
+    assert oschmod.get_owner('topdir/file1') == 'root'
+    assert oschmod.get_group('topdir/file1') == 'root'
+
+    oschmod.set_mode('topdir/file1', "go-r,u+x")
+    assert oschmod.get_mode('topdir/file1') == 0o700
+    assert not os.path.exists('topdir')
+
+    try:
+        oschmod.get_mode('topdir/missing')
+    except FileNotFoundError:
+        pass
+    else:
+        assert False, "missing path should raise"
+
+
+def test_memory_backend_recursive(memory_backend):
+    """Check recursive modes are set on a synthetic in-memory tree."""
+    count = memory_backend.populate('topdir', 3, 2, 4)
+    assert count == 1 + 14 + 15 * 4
+
+    oschmod.set_mode_recursive('topdir', "u=rw,go=", "u=rwx,go=")
+    assert memory_backend.ops['chmod'] == count
+
+    assert oschmod.get_mode('topdir') == 0o700
+    seen = 1
+    iter_tree = oschmod._iter_tree  # pylint: disable=protected-access
+    for object_type, path, _ in iter_tree('topdir', memory_backend):
+        if object_type == oschmod.DIRECTORY:
+            assert oschmod.get_mode(path) == 0o700
+        else:
+            assert oschmod.get_mode(path) == 0o600
+        seen += 1
+    assert seen == count
+
+    oschmod.set_backend(None)
+    assert oschmod.get_backend() is not memory_backend
+
+
+def test_symbolic_effective_special():
+    """Check X, s, t and copy-from symbolic forms."""
+    # X only for directories or objects already executable by someone
+    assert oschmod.get_effective_mode(0o644, "a+X") == 0o644
+    assert oschmod.get_effective_mode(0o744, "a+X") == 0o755
+    assert oschmod.get_effective_mode(
+        0o644, "a+X", oschmod.DIRECTORY) == 0o755
+    assert oschmod.get_effective_mode(0o600, "u=rwX,go=rX") == 0o644
+    assert oschmod.get_effective_mode(
+        0o600, "u=rwX,go=rX", oschmod.DIRECTORY) == 0o755
+    assert oschmod.get_effective_mode(0o755, "a-X") == 0o644
+    assert oschmod.get_effective_mode(0o600, "u+x,go+X") == 0o711
+
+    # setuid, setgid and sticky
+    assert oschmod.get_effective_mode(0o755, "u+s") == 0o4755
+    assert oschmod.get_effective_mode(0o755, "g+s") == 0o2755
+    assert oschmod.get_effective_mode(0o755, "+s") == 0o6755
+    assert oschmod.get_effective_mode(0o755, "o+s") == 0o755
+    assert oschmod.get_effective_mode(0o777, "+t") == 0o1777
+    assert oschmod.get_effective_mode(0o777, "o+t") == 0o1777
+    assert oschmod.get_effective_mode(0o777, "u+t") == 0o777
+    assert oschmod.get_effective_mode(0o6755, "ug-s") == 0o755
+    assert oschmod.get_effective_mode(0o1777, "-t") == 0o777
+    assert oschmod.get_effective_mode(0o755, "g=rxs") == 0o2755
+
+    # special bits are kept unless modified
+    assert oschmod.get_effective_mode(0o2770, "o+rx") == 0o2775
+    assert oschmod.get_effective_mode(0o1777, "go-w") == 0o1755
+    assert oschmod.get_effective_mode(0o4755, "u=rwx") == 0o755
+    assert oschmod.get_effective_mode(0o4755, "go=") == 0o4700
+    assert oschmod.get_effective_mode(0o1777, "o=rx") == 0o775
+    assert oschmod.get_effective_mode(
+        0o2775, "=rwx", oschmod.DIRECTORY) == 0o2777
+
+    # copy permissions from another class
+    assert oschmod.get_effective_mode(0o740, "o=g") == 0o744
+    assert oschmod.get_effective_mode(0o640, "g=u") == 0o660
+    assert oschmod.get_effective_mode(0o750, "go+u") == 0o777
+    assert oschmod.get_effective_mode(0o777, "g-o") == 0o707
+    assert oschmod.get_effective_mode(0o751, "u=o,o=g") == 0o155
+
+    for symbolic in ("u+ug", "u=gx", "+Y", "g+sx,o+S"):
+        try:
+            oschmod.get_effective_mode(0o777, symbolic)
+        except AttributeError:
+            continue
+        assert False, "%s should be rejected" % symbolic
+
+
+def test_symbolic_special_recursive(memory_backend):
+    """Check X and special bits are applied in a single recursive pass."""
+    memory_backend.add_dir('topdir/testdir2', 0o2770)
+    memory_backend.add_file('topdir/file1', 0o600)
+    memory_backend.add_file('topdir/testdir2/file2', 0o700)
+
+    oschmod.set_mode_recursive('topdir', "go+rX")
+
+    def full_mode(path):
+        """Get mode of object with special bits."""
+        return stat.S_IMODE(memory_backend.stat(path).st_mode)
+
+    assert full_mode('topdir') == 0o755
+    assert full_mode('topdir/testdir2') == 0o2775
+    assert full_mode('topdir/file1') == 0o644
+    assert full_mode('topdir/testdir2/file2') == 0o755
+
+    oschmod.set_mode('topdir/testdir2', "g-s,+t")
+    assert full_mode('topdir/testdir2') == 0o1775
+    # get_mode only gives permission bits, as it always has
+    assert oschmod.get_mode('topdir/testdir2') == 0o775
+
+    memory_backend.add_dir('copy/testdir2', 0o755)
+    oschmod.copy_modes_recursive('topdir', 'copy')
+    assert full_mode('copy/testdir2') == 0o1775
+
+
+def test_copy_modes_recursive(tmp_path):
+    """Check modes are copied between matching objects of two trees."""
+    src = tmp_path / 'src'
+    dst = tmp_path / 'dst'
+    for top in (src, dst):
+        os.makedirs(str(top / 'testdir2' / 'testdir3'))
+        for name in ('file1', 'testdir2/file2', 'testdir2/testdir3/file3'):
+            with open(str(top / name), 'w+') as fileh:
+                fileh.write("contents")
+    with open(str(src / 'only_src'), 'w+') as fileh:
+        fileh.write("contents")
+    with open(str(dst / 'only_dst'), 'w+') as fileh:
+        fileh.write("contents")
+
+    modes = {
+        '': 0o750, 'testdir2': 0o711, 'testdir2/testdir3': 0o700,
+        'file1': 0o640, 'testdir2/file2': 0o600,
+        'testdir2/testdir3/file3': 0o755}
+    for name, mode in modes.items():
+        oschmod.set_mode(str(src / name), mode)
+        oschmod.set_mode(str(dst / name), 0o755 if name else 0o777)
+    oschmod.set_mode(str(dst / 'only_dst'), 0o666)
+
+    stats = oschmod.copy_modes_recursive(str(src), str(dst), workers=4)
+
+    for name, mode in modes.items():
+        assert oschmod.get_mode(str(dst / name)) == mode
+    assert oschmod.get_mode(str(dst / 'only_dst')) == 0o666
+    assert stats.as_dict() == {
+        'visited': 6, 'changed': 5, 'unchanged': 1, 'missing': 1,
+        'errors': 0, 'deduplicated': 0}
+
+
+def test_copy_modes_recursive_memory(memory_backend):
+    """Check only differing modes are set when copying in memory."""
+    memory_backend.populate('src', 2, 3, 5, mode=0o600, dir_mode=0o700)
+    count = memory_backend.populate('dst', 2, 3, 5)
+    memory_backend.add_dir('src/dir1/extra')
+    oschmod.set_mode('dst/dir0/file1', 0o600)
+    memory_backend.ops.clear()
+
+    stats = oschmod.copy_modes_recursive('src', 'dst', workers=1)
+    assert memory_backend.ops['chmod'] == count - 1
+    assert stats.changed == count - 1
+    assert stats.unchanged == 1
+    assert stats.missing == 1
+
+    stats = oschmod.copy_modes_recursive('src', 'dst', workers=3)
+    assert memory_backend.ops['chmod'] == count - 1
+    assert stats.unchanged == count
+
+
+def test_cli_reference(monkeypatch, tmp_path):
+    """Check the CLI copies modes from a reference."""
+    # pylint: disable=import-outside-toplevel
+    from oschmod import cli
+
+    src = tmp_path / 'src'
+    dst = tmp_path / 'dst'
+    for top in (src, dst):
+        os.makedirs(str(top))
+        with open(str(top / 'file1'), 'w+') as fileh:
+            fileh.write("contents")
+    oschmod.set_mode(str(src / 'file1'), 0o604)
+
+    monkeypatch.setattr('sys.argv', [
+        'oschmod', '--reference', str(src / 'file1'), str(dst / 'file1')])
+    cli.main()
+    assert oschmod.get_mode(str(dst / 'file1')) == 0o604
+
+    oschmod.set_mode(str(src), 0o705)
+    oschmod.set_mode(str(src / 'file1'), 0o640)
+    monkeypatch.setattr('sys.argv', [
+        'oschmod', '-R', '--reference', str(src), str(dst)])
+    cli.main()
+    assert oschmod.get_mode(str(dst)) == 0o705
+    assert oschmod.get_mode(str(dst / 'file1')) == 0o640
+
+
+WIDE_DIR_SCRIPT = """
+import os, resource, sys, tracemalloc
+import oschmod
+path = sys.argv[1]
+for index in range(int(sys.argv[2])):
+    open(os.path.join(path, 'file%d' % index), 'w').close()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+oschmod.set_mode_recursive(path, 0o600, 0o700)
+peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(peak, after - before)
+"""
+
+
+@pytest.mark.skipif(oschmod.IS_WINDOWS, reason="needs resource module")
+def test_set_recursive_wide_memory(tmp_path, child_env):
+    """Check memory use of recursive runs does not grow with width."""
+    # a fresh interpreter so peak RSS is not set by earlier tests
+    output = subprocess.check_output(
+        [sys.executable, '-c', WIDE_DIR_SCRIPT, str(tmp_path), '50000'],
+        env=child_env)
+    peak, rss_growth = [int(value) for value in output.split()]
+
+    # listing the directory would take megabytes (ru_maxrss is in KiB)
+    assert peak < 256 * 1024
+    assert rss_growth < 2 * 1024
+    assert oschmod.get_mode(str(tmp_path / 'file49999')) == 0o600
+    assert oschmod.get_mode(str(tmp_path)) == 0o700
+
+
+def test_set_recursive_wide_memory_backend(memory_backend):
+    """Check traversal of a very wide in-memory directory is streamed."""
+    memory_backend.populate('topdir', 0, 0, 100000)
+
+    tracemalloc.start()
+    oschmod.set_mode_recursive('topdir', 0o600, 0o700)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert peak < 256 * 1024
+    assert memory_backend.ops['scandir'] == 1
+    assert memory_backend.ops['chmod'] == 100001
+    assert oschmod.get_mode('topdir/file99999') == 0o600
+
+
+def test_throttle_max_ops(memory_backend):
+    """Check recursive runs keep to a metadata operation rate."""
+    memory_backend.populate('topdir', 1, 4, 20)
+    throttle = oschmod.Throttle(max_ops=50)
+
+    start = time.time()
+    oschmod.set_mode_recursive('topdir', 0o600, 0o700, throttle=throttle)
+    elapsed = time.time() - start
+
+    # 105 chmods, 5 listings, 1 type check, less 50 in the full bucket
+    assert memory_backend.ops['chmod'] == 105
+    assert elapsed > 1.1
+    assert throttle.waited > 1.1
+
+    memory_backend.populate('other', 1, 4, 20)
+    throttle = oschmod.Throttle(max_ops=1000)
+    oschmod.copy_modes_recursive('topdir', 'other', throttle=throttle)
+    assert oschmod.get_mode('other/dir3/file19') == 0o600
+    assert throttle.waited == 0
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR1'), reason="needs SIGUSR1")
+def test_throttle_pause(memory_backend):
+    """Check recursive runs can be paused and resumed by signal."""
+    memory_backend.populate('topdir', 1, 4, 20)
+    throttle = oschmod.Throttle()
+    handlers = signal.getsignal(signal.SIGUSR1), \
+        signal.getsignal(signal.SIGUSR2)
+    throttle.install_signal_handlers()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert throttle.paused
+
+        worker = threading.Thread(
+            target=oschmod.set_mode_recursive,
+            args=('topdir', 0o600, 0o700), kwargs={'throttle': throttle})
+        worker.start()
+        time.sleep(0.3)
+        assert memory_backend.ops['chmod'] == 0
+
+        os.kill(os.getpid(), signal.SIGUSR2)
+        worker.join(5)
+        assert not throttle.paused
+        assert memory_backend.ops['chmod'] == 105
+        assert throttle.paused_seconds > 0.2
+    finally:
+        signal.signal(signal.SIGUSR1, handlers[0])
+        signal.signal(signal.SIGUSR2, handlers[1])
+
+
+@pytest.mark.skipif(not hasattr(os, 'nice'), reason="needs os.nice")
+def test_lower_io_priority(child_env):
+    """Check process priority is lowered (in a child process)."""
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import os, oschmod; print(oschmod.lower_io_priority(), os.nice(0))'
+    ], env=child_env)
+    io_set, niceness = output.split()
+    assert io_set in (b'True', b'False')
+    # niceness is only raised when the I/O priority could not be set
+    assert int(niceness) == (os.nice(0) if io_set == b'True' else 19)
+
+
+def test_concurrency_auto():
+    """Check concurrency settles around what a filesystem can serve."""
+    # at most 4 operations are served at once, the rest wait
+    backend = oschmod.MemoryBackend(latency=0.002, capacity=4)
+    count = backend.populate('topdir', 1, 2, 500)
+    controller = oschmod.ConcurrencyController()
+    stats = oschmod.Stats()
+
+    with oschmod.use_backend(backend):
+        oschmod.set_mode_recursive(
+            'topdir', 0o600, 0o700, workers=controller, stats=stats)
+        assert oschmod.get_mode('topdir/dir1/file499') == 0o600
+
+    assert backend.ops['chmod'] == count
+    assert stats.visited == count
+
+    limits = [limit for limit, _, _ in controller.history] + [
+        controller.limit]
+    assert limits[0] == 2
+    assert 4 < max(limits) < 16
+    decreases = [
+        (before, after) for before, after in zip(limits, limits[1:])
+        if after < before]
+    assert decreases
+    assert all(after == before // 2 for before, after in decreases)
+    assert any('concurrency' in message for _, message in stats.events)
+
+
+def test_concurrency_skip_idle():
+    """Check time between batches is not counted against throughput."""
+    controller = oschmod.ConcurrencyController()
+    controller.record(0.001)
+    time.sleep(0.2)
+    controller.skip(0.2)
+    for _ in range(oschmod.AUTO_WINDOW - 1):
+        controller.record(0.001)
+    assert controller.history[0][1] > 1000
+
+
+def test_concurrency_auto_copy(memory_backend):
+    """Check "auto" workers can be used when copying modes."""
+    memory_backend.populate('src', 1, 3, 100, mode=0o640,
+                            dir_mode=0o750)
+    count = memory_backend.populate('dst', 1, 3, 100)
+    stats = oschmod.copy_modes_recursive('src', 'dst', workers='auto')
+    assert stats.changed == count
+    assert oschmod.get_mode('dst/dir2/file99') == 0o640
+
+
+def test_profile_recursive():
+    """Check profiler finds the slowest subtrees."""
+    backend = oschmod.MemoryBackend(latency=0.0005)
+    backend.add_file('top/file')
+    backend.populate('top/slow', 1, 0, 60)
+    backend.populate('top/fast', 1, 0, 2)
+    profiler = oschmod.Profiler()
+    with oschmod.use_backend(backend):
+        oschmod.set_mode_recursive('top/', 'go-w', profiler=profiler)
+
+    assert profiler.directories['top'][0] == 3
+    assert profiler.directories['top/slow'][0] == 60
+    top = profiler.top(3)
+    assert [path for path, _, _, _ in top] == [
+        'top', 'top/slow', 'top/fast']
+    assert top[0][1] == 65
+    assert top[1][2] > 60 * 0.0005 and top[1][3] > 60 * 0.0005
+    assert 'top/slow' in profiler.report()
+
+    folded = io.StringIO()
+    profiler.write_folded(folded)
+    stacks = dict(line.rsplit(' ', 1)
+                  for line in folded.getvalue().splitlines())
+    assert set(stacks) == set(['top', 'top;slow', 'top;fast'])
+    assert int(stacks['top;slow']) > int(stacks['top;fast'])
+
+
+def test_dedupe_hardlinks_memory(memory_backend):
+    """Check files with several hard links are only set once."""
+    memory_backend.populate('store', 0, 0, 10)
+    memory_backend.add_dir('project/node_modules')
+    for index in range(10):
+        memory_backend.add_link('store/file%d' % index,
+                                'project/node_modules/file%d' % index)
+        memory_backend.add_link('store/file%d' % index,
+                                'project/file%d' % index)
+    assert memory_backend.stat('project/file3').st_nlink == 3
+
+    stats = oschmod.Stats()
+    oschmod.set_mode_recursive('/', 'go-r', stats=stats, dedupe_hardlinks=True)
+    assert stats.deduplicated == 20
+    assert memory_backend.ops['chmod'] == 14
+    assert oschmod.get_mode('project/file3') == 0o600
+
+
+class _CountingThrottle(oschmod.Throttle):
+    """Throttle counting the operations it lets through."""
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        super().__init__()
+        self.acquired = 0
+
+    def acquire(self, count=1):
+        """Count operations, then wait as usual."""
+        self.acquired += count
+        super().acquire(count)
+
+
+def test_dedupe_hardlinks_throttled(memory_backend):
+    """Check the stats used to find hard links are throttled."""
+    memory_backend.populate('store', 0, 0, 10)
+    for index in range(10):
+        memory_backend.add_link('store/file%d' % index, 'link%d' % index)
+
+    throttle = _CountingThrottle()
+    oschmod.set_mode_recursive('/', 0o600, 0o700, throttle=throttle,
+                               dedupe_hardlinks=True)
+    assert memory_backend.ops['stat'] == 20
+    # every counted operation, and the type check of the root, was let
+    # through the throttle
+    assert throttle.acquired == sum(memory_backend.ops.values()) + 1
+
+
+def test_dedupe_hardlinks(tmp_path):
+    """Check hard links on the filesystem are only set once."""
+    topdir = str(tmp_path / 'topdir')
+    os.makedirs(os.path.join(topdir, 'testdir'))
+    original = os.path.join(topdir, 'file1')
+    with open(original, 'w+') as fileh:
+        fileh.write("contents")
+    os.link(original, os.path.join(topdir, 'testdir', 'link1'))
+
+    stats = oschmod.set_mode_recursive(topdir, "u=rwx,go=",
+                                       dedupe_hardlinks=True)
+    assert stats.deduplicated == 1
+    assert stats.visited == 4
+    assert oschmod.get_mode(original) == 0o700
+
+
+class _ReversedBackend(oschmod.MemoryBackend):
+    """Memory backend listing directories newest first, recording chmods."""
+
+    def __init__(self):
+        super().__init__()
+        self.chmods = []
+
+    def scandir(self, path):
+        """List directory, newest entries first."""
+        return reversed(list(super().scandir(path)))
+
+    def set_mode(self, path, mode, templates=None):
+        """Record and set mode of object."""
+        self.chmods.append(path)
+        super().set_mode(path, mode, templates)
+
+
+def test_inode_order(monkeypatch):
+    """Check files are set in inode order, in bounded batches."""
+    monkeypatch.setattr(oschmod.concurrency, 'BATCH_SIZE', 8)
+    backend = _ReversedBackend()
+    backend.populate('topdir', 1, 2, 10)
+    with oschmod.use_backend(backend):
+        oschmod.set_mode_recursive('topdir', 0o600, 0o700, inode_order=True)
+
+    inodes = [backend.stat(path).st_ino for path in backend.chmods]
+    # files are streamed as listed, so those of topdir and dir0 run on
+    # until dir0 itself; each batch of 8 files is sorted
+    assert [backend.get_object_type(path) for path in backend.chmods] == \
+        [oschmod.FILE] * 20 + [oschmod.DIRECTORY] + \
+        [oschmod.FILE] * 10 + [oschmod.DIRECTORY] * 2
+    assert inodes[:8] == sorted(inodes[:8])
+    assert inodes[8:16] == sorted(inodes[8:16])
+    assert inodes[8] < inodes[7]
+    assert backend.chmods[-1] == 'topdir'
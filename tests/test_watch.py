@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""test_watch module."""
+import os
+
+import pytest
+
+import oschmod
+from oschmod import watch
+
+pytestmark = pytest.mark.skipif(
+    not watch.HAS_INOTIFY, reason="inotify is not available")
+
+
+def test_watch_new_objects(tmp_path, create_file):
+    """Check modes are set on created and moved-in objects."""
+    topdir = str(tmp_path / 'topdir')
+    outside = str(tmp_path / 'outside')
+    os.makedirs(os.path.join(topdir, 'testdir2'))
+    os.makedirs(outside)
+    create_file(os.path.join(topdir, 'existing'))
+
+    with watch.Watcher(topdir, "u=rw,go=", "u=rwx,go=") as watcher:
+        assert watcher.watched == [topdir, os.path.join(topdir, 'testdir2')]
+
+        create_file(os.path.join(topdir, 'file1'))
+        create_file(os.path.join(topdir, 'testdir2', 'file2'))
+        create_file(os.path.join(outside, 'file3'))
+        os.rename(os.path.join(outside, 'file3'),
+                  os.path.join(topdir, 'file3'))
+        assert watcher.poll(timeout=2) == 3
+
+        # new directories are watched and anything already in them is set
+        os.makedirs(os.path.join(topdir, 'testdir3', 'testdir4'))
+        create_file(os.path.join(topdir, 'testdir3', 'testdir4', 'file4'))
+        assert watcher.poll(timeout=2) >= 1
+        assert os.path.join(topdir, 'testdir3', 'testdir4') in \
+            watcher.watched
+
+        create_file(os.path.join(topdir, 'testdir3', 'testdir4', 'file5'))
+        assert watcher.poll(timeout=2) == 1
+
+        assert watcher.poll(timeout=0.1) == 0
+
+    for name in ('file1', 'testdir2/file2', 'file3', 'testdir3/testdir4/file4',
+                 'testdir3/testdir4/file5'):
+        assert oschmod.get_mode(os.path.join(topdir, name)) == 0o600
+    for name in ('testdir3', 'testdir3/testdir4'):
+        assert oschmod.get_mode(os.path.join(topdir, name)) == 0o700
+
+    # existing objects are left alone
+    assert oschmod.get_mode(os.path.join(topdir, 'existing')) == 0o666
+    assert oschmod.get_mode(os.path.join(topdir, 'testdir2')) != 0o700
+
+
+def test_watch_rescan(tmp_path, create_file):
+    """Check rescans only list directories changed since last scanned."""
+    topdir = str(tmp_path / 'topdir')
+    os.makedirs(os.path.join(topdir, 'testdir2'))
+    os.makedirs(os.path.join(topdir, 'testdir3'))
+    create_file(os.path.join(topdir, 'testdir3', 'existing'))
+    for name in ('', 'testdir2', 'testdir3'):
+        os.utime(os.path.join(topdir, name), (0, 0))
+
+    with watch.Watcher(topdir, 0o640) as watcher:
+        # as if events were lost
+        create_file(os.path.join(topdir, 'testdir2', 'file1'))
+        create_file(os.path.join(topdir, 'testdir2', 'file2'), 0o640)
+        assert watcher.rescan() == 1
+        assert watcher.stats.visited == 2
+        assert watcher.stats.unchanged == 1
+
+        # testdir2 changed too recently to trust its modification time
+        assert watcher.rescan() == 0
+        assert watcher.stats.visited == 4
+
+    assert oschmod.get_mode(
+        os.path.join(topdir, 'testdir2', 'file1')) == 0o640
+    assert oschmod.get_mode(
+        os.path.join(topdir, 'testdir3', 'existing')) == 0o666
+
+
+def test_watch_overflow(tmp_path, monkeypatch, create_file):
+    """Check objects of lost events are found after a queue overflow."""
+    monkeypatch.setattr(watch, 'RACY_SECONDS', 0)
+    topdir = str(tmp_path / 'topdir')
+    os.makedirs(topdir)
+
+    with watch.Watcher(topdir, 0o640) as watcher:
+        read_events = watcher._read_events  # pylint: disable=protected-access
+
+        def lossy_events():
+            """Drop events for file2 and report an overflow."""
+            for wd_path, mask, name in read_events():
+                if name != 'file2':
+                    yield wd_path, mask, name
+            yield None, watch.IN_Q_OVERFLOW, None
+
+        monkeypatch.setattr(watcher, '_read_events', lossy_events)
+        create_file(os.path.join(topdir, 'file1'))
+        create_file(os.path.join(topdir, 'file2'))
+        assert watcher.poll(timeout=2) == 2
+
+    for name in ('file1', 'file2'):
+        assert oschmod.get_mode(os.path.join(topdir, name)) == 0o640